@@ -47,6 +47,7 @@ class ServerMap(demo.servermap.ServerMap):
                 lever["gid"] += 1
                 if lever["gid"] == 384:
                     lever["gid"] = 381
+                self.setObjectChanged(lever)
 
                 if lever["gid"] == 381:
                     self.setLayerVisablitybyName("bridge1", True)
@@ -22,7 +22,7 @@ class ServerMap(demo.servermap.ServerMap):
 
             # unlock door (change type to normal mapDoor)
             # sprite will most likely trigger the mapDoor on the next step.
-            trigger["type"] = "mapDoor"
+            self.setObjectType(trigger, "mapDoor")
 
             # hide door locked layer and show unlocked door layer.
             if "prop-hideLayer" in trigger:
@@ -1,5 +1,6 @@
 import random
 from engine.log import log
+import engine.stepmap
 import demo.servermap
 import engine.time as time
 
@@ -22,31 +23,33 @@ class ServerMap(demo.servermap.ServerMap):
         Type "saw" will act as both a sprite and a trigger! Note, when we move the sprite the trigger will
         also move.
         '''
+        self.addServerOnlySpriteKeys("stopSawDestX", "stopSawDestY", "stopSawSpeed")
         for saw in self.findObject(type="saw", returnAll=True):
             if not self.checkKeys(saw, ["prop-maxX", "prop-minX", "prop-speed"]):
                 log("Cannot init stepSpriteStartSaw().", "ERROR")
-                saw["type"] = "sawBroken"
+                self.setObjectType(saw, "sawBroken")
             else:
-                self.triggers.append(saw)
+                self.addObject(saw, objectList=self.triggers)
 
+    @engine.stepmap.stepSpriteFilter(types=("saw",))
     def stepSpriteStartSaw(self, sprite):
-        if sprite["type"] == "saw":
-            # if saw has stopped then reverse direction.
-            if "moveDestX" not in sprite:
-                if sprite["prop-speed"] > 0:
-                    self.setSpriteDest(
-                        sprite,
-                        sprite["prop-maxX"],
-                        sprite["anchorY"],
-                        sprite["prop-speed"])
-                else:
-                    self.setSpriteDest(
-                        sprite,
-                        sprite["prop-minX"],
-                        sprite["anchorY"],
-                        sprite["prop-speed"] * -1)
-                # change direction sprite will go the next time is stops.
-                sprite["prop-speed"] *= -1
+        # if saw has stopped then reverse direction.
+        if "moveDestX" not in sprite:
+            if sprite["prop-speed"] > 0:
+                self.setSpriteDest(
+                    sprite,
+                    sprite["prop-maxX"],
+                    sprite["anchorY"],
+                    sprite["prop-speed"])
+            else:
+                self.setSpriteDest(
+                    sprite,
+                    sprite["prop-minX"],
+                    sprite["anchorY"],
+                    sprite["prop-speed"] * -1)
+            # change direction sprite will go the next time is stops.
+            sprite["prop-speed"] *= -1
+            self.setObjectChanged(sprite)
 
     def triggerSaw(self, trigger, sprite):
         # When hit by a saw the sprite is moved to it's last respawn point.
@@ -100,8 +103,9 @@ class ServerMap(demo.servermap.ServerMap):
             self.setStopSawDest(sprite)
             self.delSpriteDest(saw)
 
+    @engine.stepmap.stepSpriteFilter(types=("saw",))
     def stepSpriteEndStopSaw(self, sprite):
         # if a saw was stopped for this step then restore it back to moving.
-        if sprite["type"] == "saw" and "stopSawDestX" in sprite:
+        if "stopSawDestX" in sprite:
             self.setSpriteDest(sprite, sprite["stopSawDestX"], sprite["stopSawDestY"], sprite["stopSawSpeed"])
             self.delStopSawDest(sprite)
@@ -39,11 +39,12 @@ class Server(engine.server.Server):
         if self.mode == "waitingForPlayers":
             for ipport in self.players:
                 self.players[ipport]['marqueeText'] = "All players must gather in the stone circle to win."
-                if len(self.unassignedPlayerSprites) == 0:
+                if len(self.unassignedPlayerMapNames) == 0:
                     self.mode = "gameOn"
                     self.players[ipport]['marqueeText'] += " Game On! Click to move."
                 else:
-                    self.players[ipport]['marqueeText'] += f" Waiting for {len(self.unassignedPlayerSprites)} more players to join."
+                    self.players[ipport]['marqueeText'] += \
+                        f" Waiting for {len(self.unassignedPlayerMapNames)} more players to join."
 
             if self.mode == "gameOn":
                 self.gameStartSec = time.perf_counter()
@@ -55,13 +56,16 @@ class Server(engine.server.Server):
         # check for game won
         # if all players have joined game
         if self.mode == "gameOn":
-            end = self.maps["end"]
-            endGame = end.findObject(name="endGame", objectList=end.reference)
+            endSprites = [p["sprite"] for p in self.players.values() if p["sprite"]["mapName"] == "end"]
             playersIn = 0
-            for ipport in self.players:
-                sprite = self.players[ipport]["sprite"]
-                if sprite["mapName"] == "end" and geo.objectContains(endGame, sprite["anchorX"], sprite["anchorY"]):
-                    playersIn += 1
+            # only look up the end map once every player is on it. Looking it up every step would stop the end map
+            # from ever becoming idle and being unloaded.
+            if endSprites and len(endSprites) == len(self.players):
+                end = self.maps["end"]
+                endGame = end.findObject(name="endGame", objectList=end.reference)
+                for sprite in endSprites:
+                    if geo.objectContains(endGame, sprite["anchorX"], sprite["anchorY"]):
+                        playersIn += 1
             # if all players have made it to the end.
             if playersIn == len(self.players):
                 self.mode = "gameOver"
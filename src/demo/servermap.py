@@ -3,11 +3,12 @@ import random
 import engine.time as time
 from engine.log import log
 import engine.geometry as geo
+import engine.stepmap
 import engine.servermap
 
 '''
 The objects in object layers have the following keys added for this subclass:
-dynamic keys (only in object while in use): normalSpeed, respawnX, respawnY, respawnMapName
+dynamic keys (only in object while in use): speedMultiNormalSpeed, respawnX, respawnY, respawnMapName
 '''
 
 
@@ -43,6 +44,7 @@ class ServerMap(engine.servermap.ServerMap):
             if "action" in sprite:
                 self.delSpriteAction(sprite)
                 del sprite["holding"]  # remove bomb and delete it from game completely
+                self.setObjectChanged(sprite)
 
                 # find maps at top and bottom of ladder.
                 start = engine.server.SERVER.maps["start"]
@@ -52,14 +54,14 @@ class ServerMap(engine.servermap.ServerMap):
                 start.setLayerVisablitybyName("rockOnStairs", False)
                 start.setLayerVisablitybyName("rockOnStairs2", False)
                 start.setLayerVisablitybyName("rockOffStairs", True)
-                start.triggers.append(start.bombLadder1MapDoor)
-                start.inBounds.append(start.bombLadder1InBounds)
+                start.addObject(start.bombLadder1MapDoor, objectList=start.triggers)
+                start.addObject(start.bombLadder1InBounds, objectList=start.inBounds)
 
                 # update under map to after the bomb has done off.
                 under.setLayerVisablitybyName("rockOnStairs", False)
                 under.setLayerVisablitybyName("rockOffStairs", True)
-                under.triggers.append(under.bombLadder1MapDoor)
-                under.inBounds.append(under.bombLadder1InBounds)
+                under.addObject(under.bombLadder1MapDoor, objectList=under.triggers)
+                under.addObject(under.bombLadder1InBounds, objectList=under.inBounds)
             else:
                 self.setSpriteActionText(sprite, f"Available Action: Set off {sprite['holding']['name']}.")
         elif sprite["type"] == "player":  # if sprite is a player and is not holding bomb
@@ -108,10 +110,17 @@ class ServerMap(engine.servermap.ServerMap):
 
         return super().checkMove(object, x, y)
 
+    def checkMoves(self, rows, xs, ys):
+        # vectorized checkMove() (see engine.servermap.ServerMap.checkMoves())
+        return (self.moveColumns.moveSpeed[rows] == self.THROWSPEED) | super().checkMoves(rows, xs, ys)
+
     ########################################################
     # SPEED MULTIPLIER
     ########################################################
 
+    def initSpeedMultiplier(self):
+        self.addServerOnlySpriteKeys("speedMultiNormalSpeed")
+
     def triggerSpeedMultiplier(self, trigger, sprite):
         if not self.checkKeys(trigger, ["prop-speedMultiplier"]):
             log("Cannot process speedMultiplier trigger.", "ERROR")
@@ -121,11 +130,13 @@ class ServerMap(engine.servermap.ServerMap):
         if "moveSpeed" in sprite:
             sprite["speedMultiNormalSpeed"] = sprite["moveSpeed"]
             sprite["moveSpeed"] *= trigger["prop-speedMultiplier"]
+            self.setObjectChanged(sprite)
 
     def stepSpriteEndSpeedMultiplier(self, sprite):
         if "speedMultiNormalSpeed" in sprite:
             if "moveSpeed" in sprite:
                 sprite["moveSpeed"] = sprite["speedMultiNormalSpeed"]
+                self.setObjectChanged(sprite)
             del sprite["speedMultiNormalSpeed"]
 
     ########################################################
@@ -135,39 +146,46 @@ class ServerMap(engine.servermap.ServerMap):
     def initChichen(self):
         self.CHICKENSPEED = 10
 
+    @engine.stepmap.stepSpriteFilter(names=("chicken",))
     def stepSpriteStartChicken(self, sprite):
-        if sprite["name"] == "chicken":
-            # if this chicken is not being thrown right now then have it walk to closest player.
-            # we know something is being thrown because it's moveSpeed will be self.THROWSPEED
-            if ("moveSpeed" not in sprite or (
-                    "moveSpeed" in sprite and sprite["moveSpeed"] != self.THROWSPEED)):
-                player = False
-                playerDistance = 0
-                # find the closet player.
-                for p in self.findObject(type="player", returnAll=True):
-                    pDis = geo.distance(sprite["anchorX"], sprite["anchorY"], p["anchorX"], p["anchorY"])
-                    if pDis < playerDistance or player == False:
-                        player = p
-                        playerDistance = pDis
-                if player and playerDistance > 50:
-                    self.setSpriteDest(sprite, player["anchorX"], player["anchorY"], self.CHICKENSPEED)
-                else:
-                    self.delSpriteDest(sprite)
-
-            if random.randint(0, 5000) == 0:
-                # chicken sounds from https://www.chickensandmore.com/chicken-sounds/
-                text = random.choice((
-                    "cluck cluck",
-                    "Life is good, I'm having a good time.",
-                    "Take cover I think I see a hawk!",
-                    "buk, buk, buk, ba-gawk"
-                    ))
-                self.setSpriteSpeechText(sprite, text, time.perf_counter() + 2)
+        # if this chicken is not being thrown right now then have it walk to closest player.
+        # we know something is being thrown because it's moveSpeed will be self.THROWSPEED
+        if ("moveSpeed" not in sprite or (
+                "moveSpeed" in sprite and sprite["moveSpeed"] != self.THROWSPEED)):
+            player = False
+            playerDistance = 0
+            # find the closet player.
+            players = self.findObjectsNear(sprite["anchorX"], sprite["anchorY"], type="player", k=1)
+            if players:
+                player = players[0]
+                playerDistance = geo.distance(
+                    sprite["anchorX"], sprite["anchorY"], player["anchorX"], player["anchorY"])
+            if player and playerDistance > 50:
+                # walk around anything that is in the way, or if there is no known path then straight at the player.
+                step = self.getFlowFieldStep(sprite["anchorX"], sprite["anchorY"], player["anchorX"], player["anchorY"])
+                if not step:
+                    step = (player["anchorX"], player["anchorY"])
+                self.setSpriteDest(sprite, step[0], step[1], self.CHICKENSPEED)
+            else:
+                self.delSpriteDest(sprite)
+
+        if random.randint(0, 5000) == 0:
+            # chicken sounds from https://www.chickensandmore.com/chicken-sounds/
+            text = random.choice((
+                "cluck cluck",
+                "Life is good, I'm having a good time.",
+                "Take cover I think I see a hawk!",
+                "buk, buk, buk, ba-gawk"
+                ))
+            self.setSpriteSpeechText(sprite, text, time.perf_counter() + 2)
 
     ########################################################
     # RESPAWN POINT
     ########################################################
 
+    def initRespawnPoint(self):
+        self.addServerOnlySpriteKeys("respawnMapName", "respawnX", "respawnY")
+
     def setRespawnPoint(self, sprite):
         '''
         Remember sprites location as the last safe point the sprite was at. In case the sprite
@@ -199,5 +217,6 @@ class ServerMap(engine.servermap.ServerMap):
             # the respawn area. Let's hope it's OK to leave it where it is.
             log("Tried to respawn a sprite that does not have a respawn point.", "WARNING")
 
-    def triggerSaveRespawnPoint(self, trigger, sprite):
+    def triggerEnterSaveRespawnPoint(self, trigger, sprite):
+        # save the point where sprite entered the respawn area.
         self.setRespawnPoint(sprite)
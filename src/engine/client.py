@@ -8,6 +8,7 @@ import engine.log
 from engine.log import log
 
 import engine.network
+import engine.sprite
 import engine.loaders
 
 
@@ -139,6 +140,8 @@ class Client:
 
         self.playerNumber = -1  # set to a real number from the joinReply msg sent from the server
         self.step = False  # Currently displayed step. Empty until we get first step msg from server. = {}
+        self.STEP_HISTORY = 90  # number of past steps kept so delta step msgs can be applied to their baseline.
+        self.stepSprites = {}  # {(mapName, stepNumber): {spriteID: sprite}} for recently received steps.
         self.mapOffset = (0, 0)
 
         # Note, we must init pygame before we load tileset data.
@@ -192,7 +195,7 @@ class Client:
 
         startAt = time.perf_counter()
         nextStatusAt = startAt + 10
-        sleepTime = 0
+        idleTime = 0
         nextStepAt = startAt + (1.0 / self.fps)
         while True:
             # process messages from server (recvReplyMsgs calls msg<msgType> for each msg received)
@@ -204,19 +207,17 @@ class Client:
             # process any user input and send it to the server as required.
             self.processEvents()
 
-            # busy wait (for accuracy) until next step should start.
+            # sleep (processing msgs as they arrive) until next step should start.
             ptime = time.perf_counter()
             if ptime < nextStepAt:
-                sleepTime += nextStepAt - ptime
-
                 if ptime > nextStatusAt:
-                    # log the amount of time we are busy vs. waiting for the next step.
-                    log(f"Status: busy == {int(100-(sleepTime/(ptime-startAt)*100))}%")
+                    # log the amount of time we are busy vs. idle waiting for the next step.
+                    log(f"Status: busy == {int(100-(idleTime/(ptime-startAt)*100))}%")
                     startAt = ptime
                     nextStatusAt = startAt + 10
-                    sleepTime = 0
-                while ptime < nextStepAt:
-                    ptime = time.perf_counter()
+                    idleTime = 0
+                idleTime += self.socket.recvReplyMsgsUntil(nextStepAt)
+                ptime = time.perf_counter()
             else:
                 log("Client running slower than " + str(self.fps) + " fps.", "VERBOSE")
 
@@ -230,6 +231,34 @@ class Client:
         if ipport != self.serverIpport:
             log(f"Msg received but not from server! Msg from ({ipport}).", "WARNING")
             return
+
+        # ignore step msgs that arrive out of order.
+        if self.step and self.step["mapName"] == msg["mapName"] and self.step["stepNumber"] > msg["stepNumber"]:
+            return
+
+        # rebuild the full list of sprites from the baseline step (if this is a delta step msg) and msg sprites.
+        if "baseStepNumber" in msg:
+            baseline = (msg["mapName"], msg["baseStepNumber"])
+            if baseline not in self.stepSprites:
+                log(f"Step msg baseline {baseline} is no longer available. Step msg ignored.", "VERBOSE")
+                return
+            sprites = self.stepSprites[baseline].copy()
+            for spriteID in msg["delSpriteIDs"]:
+                sprites.pop(spriteID, None)
+        else:
+            sprites = {}
+        for sprite in msg["sprites"]:
+            sprites[sprite["spriteID"]] = engine.sprite.Sprite(sprite)
+        msg["sprites"] = list(sprites.values())
+
+        # remember sprites for this step so later delta step msgs can use it as a baseline.
+        self.stepSprites[(msg["mapName"], msg["stepNumber"])] = sprites
+        while len(self.stepSprites) > self.STEP_HISTORY:
+            del self.stepSprites[next(iter(self.stepSprites))]
+
+        # tell the server which step we have so it can send only the changes in the next step msg.
+        self.socket.sendMessage({'type': 'stepAck', 'mapName': msg["mapName"], 'stepNumber': msg["stepNumber"]})
+
         self.step = msg  # store the new step
         self.screenValidUntil = 0  # flag that we need to redraw the screen.
 
@@ -1,6 +1,7 @@
 import math
 
 from engine.log import log
+import engine.sprite
 
 """
 Note, all angles below are in radians, starting a 3 oclock and increasing clockwise.
@@ -15,15 +16,24 @@ You can convert between degrees and radians in your code as follows:
 def objectContains(object, x, y):
     """
     returns True if x,y is inside object's x,y,width,height else returns False.
+    object may be an engine.sprite.Sprite or any other mapping with the same keys.
     """
-    if "ellipse" in object:
+    if isinstance(object, engine.sprite.Sprite):
+        # read the attributes of Sprite directly since this is faster than using its dict API.
+        keys = object.props
+        ox, oy, width, height = object.x, object.y, object.width, object.height
+    else:
+        keys = object
+        ox, oy, width, height = object["x"], object["y"], object["width"], object["height"]
+
+    if "ellipse" in keys:
         pass  # not yet supported.
-    elif "point" in object:
-        if x == object["x"] and y == object["y"]:
+    elif "point" in keys:
+        if x == ox and y == oy:
             return True
     else:  # this is a rect. Tile objects ("gid") and text objects are also treated as rects.
-        if object["x"] <= x and x <= object["x"] + object["width"] and \
-           object["y"] <= y and y <= object["y"] + object["height"]:
+        if ox <= x and x <= ox + width and \
+           oy <= y and y <= oy + height:
             return True
 
     return False
@@ -93,16 +103,24 @@ def project(x, y, rad, dis):
 
 def sortRightDown(listOfGameObs, maxWidth, useAnchor=True):
     '''
-    sort list of game objects by y and then x. Do sort in place but list is also returned in case needed.
+    sort list of game objects (engine.sprite.Sprite or other mappings) by y and then x. Do sort in place but list
+    is also returned in case needed.
 
     Schwartzian Transform is used to speed up sort.
     https://gawron.sdsu.edu/compling/course_core/python_intro/intro_lecture_files/fastpython.html#setgetdel
     '''
 
+    # read the attributes of engine.sprite.Sprite objects directly since this is faster than using their dict API.
+    Sprite = engine.sprite.Sprite
     if useAnchor:  # use the anchor point to sort by
-        listOfGameObs[:] = [(maxWidth * o["anchorY"] + o["anchorX"], o) for o in listOfGameObs]
+        listOfGameObs[:] = [
+            (maxWidth * o.anchorY + o.anchorX if isinstance(o, Sprite) else maxWidth * o["anchorY"] + o["anchorX"], o)
+            for o in listOfGameObs]
     else:  # use middle of object rect to sort by
-        listOfGameObs[:] = [(maxWidth * (o["y"] + o['height'] / 2) + o["x"] + o['width'] / 2, o) for o in listOfGameObs]
+        listOfGameObs[:] = [
+            (maxWidth * (o.y + o.height / 2) + o.x + o.width / 2 if isinstance(o, Sprite) else
+             maxWidth * (o["y"] + o["height"] / 2) + o["x"] + o["width"] / 2, o)
+            for o in listOfGameObs]
     listOfGameObs.sort(key=lambda x: x[0])
     listOfGameObs[:] = [o for (k, o) in listOfGameObs]
 
@@ -0,0 +1,127 @@
+import os
+import json
+import pickle
+import zlib
+
+import engine.log
+from engine.log import log
+import engine.loaders
+import engine.time as time
+
+
+class LazyMaps:
+    '''
+    The LazyMaps class is responsible for loading maps only when they are first used and unloading
+    maps that are no longer in use, so a game can have many more maps than players visit.
+
+    LazyMaps can be used like the dict returned by engine.loaders.loadMaps() ({mapName: map, ...}) but a map is
+    only loaded, and its init* methods called, the first time it is looked up with maps[mapName]. "in", len(),
+    keys(), and looping over LazyMaps use the names of all the maps of the game without loading them.
+    self.loaded is a dict of only the maps that are loaded.
+
+    unloadIdleMaps() pickles maps that have been idle for unloadAfter seconds and releases them. A map is idle
+    while it has no players on it and has not been looked up. The next time the map is looked up it is restored
+    from the pickle in the same state it was in when it was unloaded, including any timers that were set. Maps
+    are only stepped while players are on them so timers do not run while a map is idle either way.
+    '''
+
+    def __init__(self, tilesets, game, maptype, unloadAfter=0, mapLoaded=False):
+        '''
+        unloadAfter: secs a map must be idle before it is unloaded (0 == never unload maps)
+        mapLoaded: function called with each map after the map is loaded for the first time.
+        '''
+        self.tilesets = tilesets
+        self.game = game
+        self.maptype = maptype
+        self.unloadAfter = unloadAfter
+        self.mapLoaded = mapLoaded
+
+        self.mapNames = os.listdir(f"src/{game}/maps")
+        self.loaded = {}  # {mapName: map} of maps that are loaded.
+        self.unloaded = {}  # {mapName: compressed pickle of map} of maps that have been unloaded.
+        self.idleSince = {}  # {mapName: time.perf_counter() when map became idle}
+
+    def __str__(self):
+        return engine.log.objectToStr(self)
+
+    def __getitem__(self, mapName):
+        map = self.loaded.get(mapName)
+        if map is None:
+            map = self.load(mapName)
+        else:
+            self.idleSince.pop(mapName, None)
+        return map
+
+    def __contains__(self, mapName):
+        return mapName in self.mapNames
+
+    def __iter__(self):
+        return iter(self.mapNames)
+
+    def __len__(self):
+        return len(self.mapNames)
+
+    def keys(self):
+        return list(self.mapNames)
+
+    def load(self, mapName):
+        # load mapName, or restore it if it was unloaded, and return it.
+        if mapName not in self.mapNames:
+            raise KeyError(mapName)
+
+        if mapName in self.unloaded:
+            startTime = time.perf_counter()
+            map = pickle.loads(zlib.decompress(self.unloaded.pop(mapName)))
+            map.tilesets = self.tilesets
+            duration = time.perf_counter() - startTime
+            log(f"Map {mapName}: Restored unloaded map in {duration * 1000:.1f} ms.", "VERBOSE")
+        else:
+            map = engine.loaders.loadMap(self.tilesets, self.game, self.maptype, mapName)
+            if self.mapLoaded:
+                self.mapLoaded(map)
+        self.loaded[mapName] = map
+        return map
+
+    def unload(self, mapName):
+        # pickle mapName and release it. Timers are saved with the map (see StepMap.__getstate__())
+        map = self.loaded.pop(mapName)
+        self.idleSince.pop(mapName, None)
+        self.unloaded[mapName] = zlib.compress(pickle.dumps(map, protocol=pickle.HIGHEST_PROTOCOL))
+        log(f"Map {mapName}: Unloaded idle map ({len(self.unloaded[mapName])} bytes).", "VERBOSE")
+
+    def unloadIdleMaps(self, activeMapNames):
+        '''
+        Unload maps that are not in activeMapNames (the maps with players on them) and have been idle for at
+        least self.unloadAfter seconds. Return a list of the names of the maps unloaded.
+        '''
+        unloaded = []
+        if not self.unloadAfter:
+            return unloaded
+
+        currentTime = time.perf_counter()
+        for mapName in list(self.loaded):
+            if mapName in activeMapNames:
+                self.idleSince.pop(mapName, None)
+            elif mapName not in self.idleSince:
+                self.idleSince[mapName] = currentTime
+            elif currentTime - self.idleSince[mapName] >= self.unloadAfter:
+                self.unload(mapName)
+                unloaded.append(mapName)
+        return unloaded
+
+    def findObjectMapNames(self, type, layerName="sprites"):
+        '''
+        Return a list with the name of the map of each object with type in the object layer named layerName. Only
+        the Tiled map files are read so this can be used to find objects, such as player starting locations,
+        without loading any maps.
+        '''
+        mapNames = []
+        for mapName in self.mapNames:
+            with open(f"src/{self.game}/maps/{mapName}/{mapName}.json") as f:
+                mapfiledata = json.load(f)
+            for layer in mapfiledata["layers"]:
+                if layer["type"] == "objectgroup" and layer["name"] == layerName:
+                    for object in layer["objects"]:
+                        if object.get("type") == type:
+                            mapNames.append(mapName)
+        return mapNames
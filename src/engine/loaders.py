@@ -63,6 +63,19 @@ def loadMaps(tilesets, game, maptype):
     clientmap.py, then the game folder, and then the engine folder. Therefore, each map
     could use a differnt module.
     '''
+    maps = {}
+    listing = os.listdir(f"src/{game}/maps")
+    for mapName in listing:
+        mapObj = loadMap(tilesets, game, maptype, mapName)
+        maps[mapObj.name] = mapObj
+
+    return maps
+
+
+def loadMap(tilesets, game, maptype, mapName):
+    '''
+    Return the map object for mapName. See loadMaps() for how the map's module is found.
+    '''
     if maptype == "ServerMap":
         moduleName = "servermap"
     elif maptype == "ClientMap":
@@ -72,16 +85,11 @@ def loadMaps(tilesets, game, maptype):
         exit()
 
     mapsDir = f"src/{game}/maps"
-    maps = {}
-    listing = os.listdir(mapsDir)
-    for mapName in listing:
-        module = loadModule(moduleName, game=game, mapName=mapName)
-
-        if maptype == "ServerMap":
-            mapObj = module.ServerMap(tilesets, mapsDir + "/" + mapName)
-        else:
-            mapObj = module.ClientMap(tilesets, mapsDir + "/" + mapName)
+    module = loadModule(moduleName, game=game, mapName=mapName)
 
-        maps[mapObj.name] = mapObj
+    if maptype == "ServerMap":
+        mapObj = module.ServerMap(tilesets, mapsDir + "/" + mapName)
+    else:
+        mapObj = module.ClientMap(tilesets, mapsDir + "/" + mapName)
 
-    return maps
+    return mapObj
@@ -1,8 +1,10 @@
 
-import inspect
-import os
-from datetime import datetime
+import sys
+import time
 import pprint
+import threading
+import queue
+import atexit
 
 # global printing of debug and verbose log level messages on/off
 LOGDEBUG = False
@@ -11,6 +13,15 @@ LOGVERBOSE = False
 # global printing to logfile on/off
 LOGFILE = False
 
+# {code object: "modulename.function"} for each code object that has called log(). See getCaller().
+CALLERS = {}
+
+# (second, formatted second) of the last time formatted by log(). See getTime().
+LASTSECOND = (None, None)
+
+# background thread that writes to LOGFILE. See LogFileWriter.
+LOGFILEWRITER = None
+
 
 def setLogLevel(debug=False, verbose=False):
     """
@@ -32,9 +43,15 @@ def setLogFile(filename=False):
     Turn writing to file on or off. Off by default.
     """
 
-    global LOGFILE
+    global LOGFILE, LOGFILEWRITER
+
+    if LOGFILEWRITER:
+        LOGFILEWRITER.stop()
+        LOGFILEWRITER = None
 
     LOGFILE = filename
+    if LOGFILE:
+        LOGFILEWRITER = LogFileWriter(LOGFILE)
     log("LOGFILE set to " + str(LOGFILE), "INFO")
 
 
@@ -53,44 +70,97 @@ def log(msg, level="INFO", depth=3):
 
     """
 
-    global LOGDEBUG, LOGVERBOSE, LOGFILE
-
+    # check level before doing any other work since most DEBUG and VERBOSE messages are not printed.
     if level == "DEBUG" and LOGDEBUG == False:
         return
 
     if level == "VERBOSE" and LOGVERBOSE == False:
         return
 
-    try:
-        # Get the execution frame of the calling function and use it to determine the calling filename and function name
-        # This will fail if called from a python interactive shell.
-        frame = inspect.stack()[1]
-        module = inspect.getmodule(frame[0])
-        filename = os.path.basename(module.__file__)
-        modulename = module.__name__
-        function = frame[0].f_code.co_name
-        if function != '<module>':
-            function = function + '()'
-    except Exception as e:
-        modulename = '-'
-        filename = '-'
-        function = '-'
-
-    time = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-
     # format msg to be human readable
     if(isinstance(msg, dict)):
         msg = dictToStr(msg, depth)
     else:
         msg = str(msg)
 
-    output = level + ' ' + str(time) + ' ' + str(modulename) + '.' + str(function) + ': ' + msg
+    output = level + ' ' + getTime() + ' ' + getCaller() + ': ' + msg
 
     print(output)
 
-    if LOGFILE:
-        with open(LOGFILE, "a+") as f:
-            f.write(output + "\n")
+    if LOGFILEWRITER:
+        LOGFILEWRITER.write(output)
+
+
+def getCaller():
+    # return "modulename.function()" of the function that called log().
+    try:
+        # Get the execution frame of the function that called log() and use it to determine the
+        # calling module name and function name. The result is cached per code object since
+        # it will be the same for every call from the same function.
+        code = sys._getframe(2).f_code
+        if code not in CALLERS:
+            modulename = sys._getframe(2).f_globals["__name__"]
+            function = code.co_name
+            if function != '<module>':
+                function = function + '()'
+            CALLERS[code] = str(modulename) + '.' + str(function)
+        return CALLERS[code]
+    except Exception as e:
+        # This will fail if called from a python interactive shell.
+        return '-.-'
+
+
+def getTime():
+    # return the current time in the format YYYY-MM-DD HH:MM:SS.mmm
+    global LASTSECOND
+
+    now = time.time()
+    second = int(now)
+    if second != LASTSECOND[0]:
+        LASTSECOND = (second, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second)))
+    return LASTSECOND[1] + '.' + str(int((now - second) * 1000)).zfill(3)
+
+
+class LogFileWriter:
+    '''
+    The LogFileWriter class writes log lines to a file from a background thread so log() does
+    not wait on disk. The file is kept open and lines are written and flushed in batches.
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="LogFileWriter", daemon=True)
+        self.thread.start()
+        # make sure everything queued is written before python exits.
+        atexit.register(self.stop)
+
+    def write(self, line):
+        self.queue.put(line)
+
+    def stop(self):
+        # write any queued lines, close the file, and end the background thread.
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        atexit.unregister(self.stop)
+
+    def run(self):
+        with open(self.filename, "a+") as f:
+            while True:
+                # wait for a line and then take all other lines that are already queued.
+                lines = [self.queue.get()]
+                while True:
+                    try:
+                        lines.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                stop = None in lines
+                f.write("".join(line + "\n" for line in lines if line is not None))
+                f.flush()
+                if stop:
+                    return
 
 
 def dictToStr(object, depth=3):
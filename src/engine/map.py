@@ -3,6 +3,10 @@ import json
 import engine.log
 from engine.log import log
 import engine.geometry as geo
+import engine.spatialgrid
+import engine.sprite
+import engine.objectlist
+import engine.mapcache
 
 
 class Map:
@@ -13,8 +17,11 @@ class Map:
     It is assumed the map class with be sub-classed to add additional functionality.
 
     Most of the data cleaning is performed on objects from Tiled object layers.
-    Tiled layer objects are stored as Python Dictionaries.
+    Tiled layer objects are stored as engine.sprite.Sprite objects which can be used like Python Dictionaries.
     (https://www.w3schools.com/python/python_dictionaries.asp)
+    The required keys and tile keys can also be read as attributes (eg. sprite.anchorX) which is faster.
+    The objects of each object layer are stored in an engine.objectlist.ObjectList which can be used like a
+    Python list.
 
     The map engine ensures all objects in Tiled object layers have the following:
         - Required keys (always present): name, type, x, y, width, height, anchorX, anchorY
@@ -55,17 +62,37 @@ class Map:
         self.mapDir = mapDir
 
         # Flag to say something on this map has changed
+        self.changeVersion = 0  # incremented each time something on this map changes.
+        self.changedObjects = {}  # {id(object): object} changed since delChangedObjects(). See setObjectChanged()
         self.setMapChanged()
 
+        # Spatial grids for quick x,y searches of some object lists, indexed by id(objectList). See findObject().
+        self.objectGrids = {}
+        # Name and type indexes of object lists, indexed by id(objectList). See addObjectIndex().
+        self.objectIndexes = {}
+        # Anchor grids, by type, for quick nearest object searches of some object lists. See addAnchorGrid().
+        self.anchorGrids = {}
+        # order given to the next object added to an anchor grid. Shared by all grids so objects the same distance
+        # away are found in the order they were added to their object list, no matter which grid they are in.
+        self.anchorGridNextOrder = 0
+
         # Maps are named based on their mapDirectory
         self.name = mapDir.split("/")[-1]
 
         # store the game name in case we need it.
         self.game = mapDir.split("/")[-3]
 
-        # read tiled map file.
-        with open(mapDir + "/" + self.name + ".json") as f:
-            mapfiledata = json.load(f)
+        # read tiled map file, or if the map has been loaded before then the already cleaned data from the cache.
+        mapFile = mapDir + "/" + self.name + ".json"
+        cacheName = f"{self.game}-{self.name}-{type(self).__name__}"
+        cacheKey = engine.mapcache.getCacheKey(
+            self, [mapFile] + [tileset.tilesetFile for tileset in self.tilesets.values()],
+            (engine.sprite.Sprite, engine.objectlist.ObjectList))
+        mapfiledata = engine.mapcache.loadCache(cacheName, cacheKey)
+        cached = mapfiledata is not None
+        if not cached:
+            with open(mapFile) as f:
+                mapfiledata = json.load(f)
 
         # ensure tiled map file is correct format.
         if mapfiledata["type"] != "map" or \
@@ -95,20 +122,76 @@ class Map:
             name = ts["source"].split("/")[-1].split(".")[0]
             self.tsFirstGid[name] = ts["firstgid"]
 
+        '''
+        Create quick reference list from gid to tileset name and tileset tile number (see findTile()).
+        [None, (tilesetName1, 0), (tilesetName1, 1), ..., (tilesetName2, 0), ...]
+        '''
+        self.gidTiles = []
+        for tilesetName, firstGid in self.tsFirstGid.items():
+            lastGid = firstGid + self.tilesets[tilesetName].tilecount - 1
+            if len(self.gidTiles) <= lastGid:
+                self.gidTiles.extend([None] * (lastGid + 1 - len(self.gidTiles)))
+            for tileGid in range(firstGid, lastGid + 1):
+                if self.gidTiles[tileGid] is None:
+                    self.gidTiles[tileGid] = (tilesetName, tileGid - firstGid)
+
         # convert layer visibility data into a more compact form that is better for sending over network.
         self.layerVisabilityMask = 0
         for layerIndex in range(len(self.layers)):
             if self.layers[layerIndex]["visible"] == True:
                 self.setLayerVisablitybyIndex(layerIndex, True)
 
+        if not cached:
+            '''
+            objects loaded from tiled need some data conversion and clean up to be useful
+            '''
+            for layer in self.layers:
+                if layer["type"] == "objectgroup":
+                    # replace the list of dicts loaded from the tiled file with an ObjectList of sprites.
+                    layer['objects'] = engine.objectlist.ObjectList(
+                        engine.sprite.Sprite(object) for object in layer['objects'])
+                    for object in layer['objects']:
+                        '''
+                        convert tiled object properties into an easier to access form.
+                        from: {object["properties"][{name: name1, value: value1}],[...]}
+                        to: {object["prop-name1"]=value1,...}
+
+                        Note, duplicate property names is not supported!
+                        '''
+                        if "properties" in object:
+                            for prop in object["properties"]:
+                                object["prop-" + prop["name"]] = prop["value"]
+                            del object["properties"]
+
+                        # if this is a tiled "tile object"
+                        if "gid" in object:
+                            '''
+                            tiled tile objects are anchored at bottom left but we want to anchor
+                            all objects to the top left.
+                            '''
+                            object["y"] -= object["height"]
+
+                        # remove object keys that Tiled saves but the game engine does not use/support.
+                        # Doing this will help reduce unneeded data from being sent over the network.
+                        for key in ("rotation", "id", "visible"):
+                            if key in object:
+                                del object[key]
+
+                        # finally check the object for any other missing data or other issues that is not directly
+                        # related to the tiled file format.
+                        self.checkObject(object)
+
+            # save the cleaned map data so the next start can skip reading the tiled file and cleaning the objects.
+            engine.mapcache.saveCache(cacheName, cacheKey, mapfiledata)
+
         # set up quick reference to object lists of well known object layers.
         # these can be used directly rather than searching for these layers over and over.
         # it also ensures all these layers exist (via these refernces) in case they were not in the Tiled file.
-        self.triggers = []
-        self.sprites = []
-        self.reference = []
-        self.inBounds = []
-        self.outOfBounds = []
+        self.triggers = engine.objectlist.ObjectList()
+        self.sprites = engine.objectlist.ObjectList()
+        self.reference = engine.objectlist.ObjectList()
+        self.inBounds = engine.objectlist.ObjectList()
+        self.outOfBounds = engine.objectlist.ObjectList()
         for l in self.layers:
             if l["type"] == "objectgroup":
                 if l["name"] == "triggers":
@@ -122,45 +205,59 @@ class Map:
                 elif l["name"] == "outOfBounds":
                     self.outOfBounds = l['objects']
 
-        '''
-        objects loaded from tiled need some data conversion and clean up to be useful
-        '''
-        for layer in self.layers:
-            if layer["type"] == "objectgroup":
-                for object in layer['objects']:
-                    '''
-                    convert tiled object properties into an easier to access form.
-                    from: {object["properties"][{name: name1, value: value1}],[...]}
-                    to: {object["prop-name1"]=value1,...}
-
-                    Note, duplicate property names is not supported!
-                    '''
-                    if "properties" in object:
-                        for prop in object["properties"]:
-                            object["prop-" + prop["name"]] = prop["value"]
-                        del object["properties"]
-
-                    # if this is a tiled "tile object"
-                    if "gid" in object:
-                        '''
-                        tiled tile objects are anchored at bottom left but we want to anchor
-                        all objects to the top left.
-                        '''
-                        object["y"] -= object["height"]
+        # index object lists that are searched by x,y every step.
+        for objectList in (self.triggers, self.inBounds, self.outOfBounds):
+            self.addObjectGrid(objectList)
 
-                    # remove object keys that Tiled saves but the game engine does not use/support.
-                    # Doing this will help reduce unneeded data from being sent over the network.
-                    for key in ("rotation", "id", "visible"):
-                        if key in object:
-                            del object[key]
+        # index sprites so sprites can find other sprites near them.
+        self.addAnchorGrid(self.sprites)
 
-                    # finally check the object for any other missing data or other issues that is not directly
-                    # related to the tiled file format.
-                    self.checkObject(object)
+        # index all object lists by name and type.
+        for objectList in [l['objects'] for l in self.layers if l["type"] == "objectgroup"] + \
+                [self.triggers, self.sprites, self.reference, self.inBounds, self.outOfBounds]:
+            if id(objectList) not in self.objectIndexes:
+                self.addObjectIndex(objectList)
 
     def __str__(self):
         return engine.log.objectToStr(self, depth=2)
 
+    ########################################################
+    # PICKLE (used by engine.lazymaps to unload maps)
+    ########################################################
+
+    def __getstate__(self):
+        '''
+        Return the state of this map for pickle.
+
+        Objects get new ids when they are unpickled so anything indexed by id() is saved in a form that
+        does not use ids and is rebuilt by __setstate__(). self.tilesets is shared by all maps so it is not
+        saved and must be set again after the map is unpickled.
+        '''
+        state = self.__dict__.copy()
+        del state["tilesets"]
+
+        objectLists = {id(objectList): objectList for objectList, index in self.objectIndexes.values()}
+        state["objectGrids"] = [objectLists[listID] for listID in self.objectGrids]
+        state["anchorGrids"] = [objectLists[listID] for listID in self.anchorGrids]
+        state["objectIndexes"] = list(objectLists.values())
+        state["changedObjects"] = list(self.changedObjects.values())
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tilesets = None  # must be set by the code unpickling the map.
+
+        self.changedObjects = {id(object): object for object in state["changedObjects"]}
+        self.objectGrids = {}
+        for objectList in state["objectGrids"]:
+            self.addObjectGrid(objectList)
+        self.anchorGrids = {}
+        for objectList in state["anchorGrids"]:
+            self.addAnchorGrid(objectList)
+        self.objectIndexes = {}
+        for objectList in state["objectIndexes"]:
+            self.addObjectIndex(objectList)
+
     ########################################################
     # MAP CHANGED
     ########################################################
@@ -168,6 +265,22 @@ class Map:
     def setMapChanged(self, changed=True):
         # flag the map has changed or not changed.
         self.changed = changed
+        if changed:
+            self.changeVersion += 1
+
+    def setObjectChanged(self, object):
+        '''
+        Flag that object has changed in a way players may need to see and that the map has changed. This is
+        how the server knows which sprites to serialize again for step msgs (see engine.server.Server.addStepSnapshot())
+        so code that changes a sprite key sent to clients must call this. Changes to keys only the server
+        uses (see engine.servermap.ServerMap.addServerOnlySpriteKeys()) do not need to be flagged.
+        '''
+        self.changedObjects[id(object)] = object
+        self.setMapChanged()
+
+    def delChangedObjects(self):
+        # forget which objects have changed. Called once the changes have been recorded.
+        self.changedObjects = {}
 
     ########################################################
     # LAYER VISABILITY
@@ -213,12 +326,8 @@ class Map:
 
     def findTile(self, tileGid):
         # converts Gid for this map to a specific tileset name and tileset tile number.
-        for tilesetName in self.tsFirstGid:
-            firstGid = self.tsFirstGid[tilesetName]
-            lastGid = firstGid + self.tilesets[tilesetName].tilecount - 1
-            if firstGid <= tileGid and tileGid <= lastGid:
-                tilesetTileNumber = tileGid - firstGid
-                return tilesetName, tilesetTileNumber
+        if 0 <= tileGid < len(self.gidTiles) and self.gidTiles[tileGid] is not None:
+            return self.gidTiles[tileGid]
 
         # By design, this should never happen so we need to quit!
         log(f"tileGid {str(tileGid)} not found in map {self.name}!", "FAILURE")
@@ -226,9 +335,8 @@ class Map:
 
     def findGid(self, tilesetSearchName, tilesetTileSearchNumber):
         # converts a tileset specific tile number to a Gid of this map.
-        for tilesetName in self.tsFirstGid:
-            if tilesetName == tilesetSearchName:
-                return self.tsFirstGid[tilesetName] + tilesetTileSearchNumber
+        if tilesetSearchName in self.tsFirstGid:
+            return self.tsFirstGid[tilesetSearchName] + tilesetTileSearchNumber
 
         # By design this should never happen so we need to quit!
         # This probably means a tile object was added to this map but this map does
@@ -236,15 +344,89 @@ class Map:
         log(f"tilesetName {str(tilesetSearchName)} not found in map {self.name}!", "FAILURE")
         exit()
 
+    ########################################################
+    # OBJECT GRIDS
+    ########################################################
+
+    def addObjectGrid(self, objectList):
+        '''
+        Index objectList with a spatial grid so findObject(x, y) on objectList does not need to check every object.
+        The grid is kept up to date by addObject(), removeObject(), and setObjectLocationBy*() so objects must only
+        be added, removed, or moved with those methods.
+        '''
+        cellSize = max(self.tilewidth, self.tileheight) * 4
+        self.objectGrids[id(objectList)] = engine.spatialgrid.SpatialGrid(cellSize, objectList)
+
+    def updateObjectGrids(self, object):
+        # update the location of object in all spatial grids that contain object.
+        for grid in self.objectGrids.values():
+            grid.update(object)
+        for gridsByType in self.anchorGrids.values():
+            if object.type in gridsByType:
+                gridsByType[object.type].update(object)
+
+    def addAnchorGrid(self, objectList):
+        '''
+        Index the anchors of objectList with one anchor grid for each object type so findObjectsNear() on objectList
+        does not need to check every object. The grids are kept up to date by addObject(), removeObject(),
+        setObjectType(), and setObjectLocationBy*().
+        '''
+        self.anchorGrids[id(objectList)] = {}
+        for object in objectList:
+            self.addToAnchorGrid(object, objectList)
+
+    def addToAnchorGrid(self, object, objectList, order=None):
+        # order is None for objects that have just been added to the end of objectList.
+        if order is None:
+            order = self.anchorGridNextOrder
+            self.anchorGridNextOrder += 1
+        gridsByType = self.anchorGrids[id(objectList)]
+        if object["type"] not in gridsByType:
+            cellSize = max(self.tilewidth, self.tileheight) * 4
+            gridsByType[object["type"]] = engine.spatialgrid.AnchorGrid(cellSize)
+        gridsByType[object["type"]].add(object, order)
+
+    def removeFromAnchorGrid(self, object, objectList, type):
+        gridsByType = self.anchorGrids[id(objectList)]
+        if type in gridsByType:
+            gridsByType[type].remove(object)
+            if not len(gridsByType[type]):
+                del gridsByType[type]
+
+    ########################################################
+    # OBJECT INDEXES
+    ########################################################
+
+    def addObjectIndex(self, objectList):
+        '''
+        Index objectList by name and type so findObject(name=...) and findObject(type=...) on objectList do
+        not need to check every object. The index is kept up to date by addObject(), removeObject(), and
+        setObjectType() so objects must only be added, removed, or have their type changed with those methods.
+
+        self.objectIndexes[id(objectList)] = (objectList, {"name": {name: objects}, "type": {type: objects}})
+        where objects is an ObjectList of the objects with name or type, in the same order as objectList.
+        '''
+        index = {"name": {}, "type": {}}
+        for object in objectList:
+            for key in index:
+                if object[key] not in index[key]:
+                    index[key][object[key]] = engine.objectlist.ObjectList()
+                index[key][object[key]].append(object)
+        self.objectIndexes[id(objectList)] = (objectList, index)
+
     ########################################################
     # OBJECT LIST (default objectList is self.sprites)
     ########################################################
 
+    def isObjectList(self, objectList):
+        # return True if objectList is an object list rather than False, which means use the default (self.sprites).
+        return isinstance(objectList, (list, engine.objectlist.ObjectList))
+
     def addObject(self, object, objectList=False):
         # add object to one of the object list of an object layer on this map.
         # assumes that objectList is from an object layer on this map.
 
-        if not isinstance(objectList, list):
+        if not self.isObjectList(objectList):
             objectList = self.sprites
 
         # record in the object itself that it is now on this map.
@@ -252,12 +434,22 @@ class Map:
 
         # add object to list
         objectList.append(object)
+        if id(objectList) in self.objectGrids:
+            self.objectGrids[id(objectList)].add(object)
+        if id(objectList) in self.objectIndexes:
+            index = self.objectIndexes[id(objectList)][1]
+            for key in index:
+                if object[key] not in index[key]:
+                    index[key][object[key]] = engine.objectlist.ObjectList()
+                index[key][object[key]].append(object)
+        if id(objectList) in self.anchorGrids:
+            self.addToAnchorGrid(object, objectList)
 
         # Update tile gid since destMap may have a different gid for the same tile image.
         if "gid" in object:
             object["gid"] = self.findGid(object["tilesetName"], object["tilesetTileNumber"])
 
-        self.setMapChanged()
+        self.setObjectChanged(object)
 
     def removeObject(self, object, objectList=False):
         # remove object from objectlist. Assumes object is in list.
@@ -265,12 +457,43 @@ class Map:
         # Note, do not remove self.mapName from object["mapName"] since the object could be in
         # more than one list for this map.
 
-        if not isinstance(objectList, list):
+        if not self.isObjectList(objectList):
             objectList = self.sprites
 
         objectList.remove(object)
+        if id(objectList) in self.objectGrids:
+            self.objectGrids[id(objectList)].remove(object)
+        if id(objectList) in self.objectIndexes:
+            index = self.objectIndexes[id(objectList)][1]
+            for key in index:
+                index[key][object[key]].remove(object)
+                if not index[key][object[key]]:
+                    del index[key][object[key]]
+        if id(objectList) in self.anchorGrids:
+            self.removeFromAnchorGrid(object, objectList, object["type"])
         self.setMapChanged()
 
+    def setObjectType(self, object, type):
+        # change the type of object. Use this rather than setting object["type"] directly so
+        # anything that finds objects by type stays up to date.
+        oldType = object["type"]
+        object["type"] = type
+        for grid in self.objectGrids.values():
+            grid.touch(object)
+        for objectList, index in self.objectIndexes.values():
+            if oldType in index["type"] and object in index["type"][oldType]:
+                index["type"][oldType].remove(object)
+                if not index["type"][oldType]:
+                    del index["type"][oldType]
+                # rebuild list for new type so it stays in the same order as objectList.
+                index["type"][type] = engine.objectlist.ObjectList(o for o in objectList if o["type"] == type)
+                if id(objectList) in self.anchorGrids:
+                    # keep object's order since its position in objectList has not changed.
+                    order = self.anchorGrids[id(objectList)][oldType].getOrder(object)
+                    self.removeFromAnchorGrid(object, objectList, oldType)
+                    self.addToAnchorGrid(object, objectList, order)
+        self.setObjectChanged(object)
+
     def findObject(self, x=False, y=False, name=False, type=False, objectList=False, exclude=False, returnAll=False):
         '''
         if returnAll = False (default) then return first object in objectList that meets criteria provided.
@@ -282,13 +505,24 @@ class Map:
         Note, exclude is normally used to filter out an object that is being acted on but is also in the
         list being searched.
         '''
-        if not isinstance(objectList, list):
+        if not self.isObjectList(objectList):
             objectList = self.sprites
 
+        # if objectList has a spatial grid then only check objects that contain x,y.
+        # else if objectList has a name/type index then only check objects with the name or type.
+        if not (x == False or y == False) and id(objectList) in self.objectGrids:
+            objectList = self.objectGrids[id(objectList)].findObjects(x, y)
+        elif id(objectList) in self.objectIndexes and not (name == False and type == False):
+            index = self.objectIndexes[id(objectList)][1]
+            if name != False:
+                objectList = index["name"].get(name, ())
+            else:
+                objectList = index["type"].get(type, ())
+
         found = []
         for object in objectList:
-            if (type == False or object['type'] == type) and \
-               (name == False or object['name'] == name) and \
+            if (type == False or object.type == type) and \
+               (name == False or object.name == name) and \
                (exclude == False or exclude != object) and \
                (x == False or y == False or geo.objectContains(object, x, y)):
                 if not returnAll:
@@ -299,43 +533,86 @@ class Map:
             return False
         return found
 
+    def findObjectsNear(self, x, y, type=False, k=False, radius=False, objectList=False, exclude=False):
+        '''
+        return a list of the objects in objectList whose anchors are closest to x, y, sorted by distance (closest
+        first). Objects the same distance away are in the order they were added to objectList.
+            type: only return objects of type (False == any type)
+            k: max number of objects to return (False == no limit)
+            radius: only return objects with anchors at most radius from x, y (False == no limit)
+            exclude: an object to leave out of the result, normally the object doing the searching.
+        '''
+        if k is not False and k <= 0:
+            return []
+        if not self.isObjectList(objectList):
+            objectList = self.sprites
+
+        if id(objectList) in self.anchorGrids:
+            gridsByType = self.anchorGrids[id(objectList)]
+            if type == False:
+                grids = gridsByType.values()
+            elif type in gridsByType:
+                grids = (gridsByType[type],)
+            else:
+                grids = ()
+            found = []
+            for grid in grids:
+                found += grid.findNear(x, y, k=k, radius=radius, exclude=exclude)
+            if len(grids) > 1:
+                found.sort(key=lambda f: (f[0], f[1]))
+        else:
+            # objectList is not indexed so check every object.
+            found = []
+            for order, object in enumerate(objectList):
+                if (type == False or object.type == type) and object is not exclude:
+                    distance = geo.distance(x, y, object.anchorX, object.anchorY)
+                    if radius is False or distance <= radius:
+                        found.append((distance, order, object))
+            found.sort(key=lambda f: (f[0], f[1]))
+
+        if k is not False:
+            del found[k:]
+        return [f[2] for f in found]
+
     ########################################################
     # OBJECTS (mostly useful for sprites)
     ########################################################
 
     def checkObject(self, object):
         # ensure object meets all basic criteria that are required by the server.
-        # object must be a dictionary {}
-
-        if "mapName" not in object:
-            object["mapName"] = self.name
-        if "name" not in object:
-            object["name"] = ""
-        if "type" not in object:
-            object["type"] = ""
-        if "width" not in object:
-            object["width"] = 0
-        if "height" not in object:
-            object["height"] = 0
+        # object must be an engine.sprite.Sprite
+
+        if not hasattr(object, "mapName"):
+            object.mapName = self.name
+        if not hasattr(object, "name"):
+            object.name = ""
+        if not hasattr(object, "type"):
+            object.type = ""
+        if not hasattr(object, "width"):
+            object.width = 0
+        if not hasattr(object, "height"):
+            object.height = 0
 
         # if this is a Tile Object
-        if "gid" in object and ("tilesetName" not in object or "tilesetTileNumber" not in object):
+        if hasattr(object, "gid") and not (hasattr(object, "tilesetName") and hasattr(object, "tilesetTileNumber")):
             '''
             objects may move between maps so in addition to the gid in this map we need to store
             the tileset name and tile number relative to the tileset so it can be used in other maps.
             '''
-            object["tilesetName"], object["tilesetTileNumber"] = self.findTile(object["gid"])
+            object.tilesetName, object.tilesetTileNumber = self.findTile(object.gid)
 
         # we assume that if object has x then it has y AND if it has anchorX then it has anchorY
-        if "x" not in object and "anchorX" not in object:
-            object["x"] = 0
-            object["anchorX"] = 0
-            object["y"] = 0
-            object["anchorY"] = 0
-        elif "x" in object and "anchorX" not in object:
-            self.setObjectLocationByXY(object, object["x"], object["y"])
-        elif "x" not in object and "anchorX" in object:
-            self.setObjectLocationByAnchor(object, object["anchorX"], object["anchorY"])
+        hasX = hasattr(object, "x")
+        hasAnchorX = hasattr(object, "anchorX")
+        if not hasX and not hasAnchorX:
+            object.x = 0
+            object.anchorX = 0
+            object.y = 0
+            object.anchorY = 0
+        elif hasX and not hasAnchorX:
+            self.setObjectLocationByXY(object, object.x, object.y)
+        elif not hasX and hasAnchorX:
+            self.setObjectLocationByAnchor(object, object.anchorX, object.anchorY)
 
         # The original object has been edited but also return it so the function can be passed
         return object
@@ -343,34 +620,38 @@ class Map:
     def setObjectLocationByXY(self, object, x, y):
         # set an objects location using its top/left corner.
 
-        object["x"], object["y"] = x, y
+        object.x, object.y = x, y
         '''
         set the anchor for the object, this is the point we consider to be the point
         location of the object.
         '''
-        if "gid" in object:
+        if hasattr(object, "gid"):
             # for tile objects, the tileset will define the anchor point.
-            object["anchorX"] = object["x"] + self.tilesets[object["tilesetName"]].tileoffsetX
-            object["anchorY"] = object["y"] + self.tilesets[object["tilesetName"]].tileoffsetY
+            tileset = self.tilesets[object.tilesetName]
+            object.anchorX = x + tileset.tileoffsetX
+            object.anchorY = y + tileset.tileoffsetY
         else:
             # set anchor to be the middle of the objects rect.
-            object["anchorX"] = object["x"] + object["width"] / 2
-            object["anchorY"] = object["y"] + object["height"] / 2
+            object.anchorX = x + object.width / 2
+            object.anchorY = y + object.height / 2
 
-        self.setMapChanged()
+        self.updateObjectGrids(object)
+        self.setObjectChanged(object)
 
     def setObjectLocationByAnchor(self, object, anchorX, anchorY):
         # set an objects location using its anchor point.
 
-        object["anchorX"], object["anchorY"] = anchorX, anchorY
-        if "gid" in object:
-            object["x"] = anchorX - self.tilesets[object["tilesetName"]].tileoffsetX
-            object["y"] = anchorY - self.tilesets[object["tilesetName"]].tileoffsetY
+        object.anchorX, object.anchorY = anchorX, anchorY
+        if hasattr(object, "gid"):
+            tileset = self.tilesets[object.tilesetName]
+            object.x = anchorX - tileset.tileoffsetX
+            object.y = anchorY - tileset.tileoffsetY
         else:
             # set anchor to be the middle of the objects rect.
-            object["x"] = anchorX - object["width"] / 2
-            object["y"] = anchorY - object["height"] / 2
-        self.setMapChanged()
+            object.x = anchorX - object.width / 2
+            object.y = anchorY - object.height / 2
+        self.updateObjectGrids(object)
+        self.setObjectChanged(object)
 
     def setObjectMap(self, object, destMap):
         # remove object from all known layers on this map and add to same layers on destMap
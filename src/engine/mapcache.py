@@ -0,0 +1,110 @@
+import os
+import sys
+import hashlib
+import pickle
+import inspect
+
+from engine.log import log
+
+'''
+The mapcache module stores the data of Tiled map and tileset files after the engine has loaded and cleaned it
+(see engine.map.Map and engine.tileset.Tileset) so the next start can skip parsing and cleaning the files.
+
+Each cache file is keyed on a hash of:
+    - CACHE_VERSION, which should be incremented if the cache file format changes.
+    - The source code of the class doing the loading and all the classes it inherits from, since those
+      may change how the data is cleaned (eg. a game that overrides Map.checkObject()), and of any other
+      classes stored in the data (eg. engine.sprite.Sprite).
+    - The contents of the Tiled files the data came from.
+So a cache file is never used after any of those change. Cache files are only a copy of data that can be
+rebuilt so the cache directory can be deleted at any time.
+
+Cache files are read with pickle, which can run any code stored in the file, so the cache directory must not be
+writable by other users. saveCache() creates the directory so only the current user can use it and, on systems
+with file owners (not Windows), loadCache() ignores the cache if the directory is owned by, or writable by, anyone
+else.
+'''
+
+CACHE_VERSION = 1
+CACHEDIR = "cache"  # relative to the working directory, the same as the src/ paths used by engine.loaders
+
+FILEHASHES = {}  # {filename: (mtime, size, hash)} so each file is only hashed once per run.
+
+
+def getFileHash(filename):
+    # return the sha256 hex digest of the contents of filename.
+    stat = os.stat(filename)
+    if filename not in FILEHASHES or FILEHASHES[filename][:2] != (stat.st_mtime, stat.st_size):
+        with open(filename, "rb") as f:
+            FILEHASHES[filename] = (stat.st_mtime, stat.st_size, hashlib.sha256(f.read()).hexdigest())
+    return FILEHASHES[filename][2]
+
+
+def getCacheKey(loader, filenames, classes=()):
+    '''
+    Return the cache key for the data loader (a Map or Tileset object) loads from the files in filenames.
+    classes are other classes whose objects are stored in the data.
+    '''
+    parts = [str(CACHE_VERSION), sys.version]
+    for cls in type(loader).__mro__ + tuple(classes):
+        parts.append(f"{cls.__module__}.{cls.__qualname__}")
+        try:
+            parts.append(getFileHash(inspect.getsourcefile(cls)))
+        except (TypeError, OSError):
+            pass  # built in class, such as object, which has no source file.
+    for filename in filenames:
+        parts.append(getFileHash(filename))
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def getCacheFilename(name, key):
+    return f"{CACHEDIR}/{name}-{key}.pickle"
+
+
+def isCacheDirSafe():
+    # return True if only the current user can write to CACHEDIR (see module docstring).
+    if not hasattr(os, "getuid"):
+        return True  # Windows, which does not have unix style file owners and permissions.
+    stat = os.stat(CACHEDIR)
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+def loadCache(name, key):
+    # return the data saved with saveCache(name, key, data) or None if it was not found or could not be read.
+    filename = getCacheFilename(name, key)
+    if not os.path.isfile(filename):
+        return None
+    if not isCacheDirSafe():
+        log(f"Not using cache directory {CACHEDIR} because it is owned by or writable by other users.", "WARNING")
+        return None
+    try:
+        with open(filename, "rb") as f:
+            data = pickle.load(f)
+    except Exception as e:
+        log(f"Could not read cache file {filename}: {e}", "WARNING")
+        return None
+    log(f"Loaded {name} from cache file {filename}.", "VERBOSE")
+    return data
+
+
+def saveCache(name, key, data):
+    '''
+    Save data so it can be returned by loadCache(name, key). Older cache files for name are deleted. Failing
+    to save is not an error since the data can always be loaded from the Tiled files again.
+    '''
+    filename = getCacheFilename(name, key)
+    try:
+        os.makedirs(CACHEDIR, mode=0o700, exist_ok=True)
+        # write to a temp file and then rename so other processes never read a partly written cache file.
+        tempFilename = f"{filename}.{os.getpid()}.tmp"
+        with open(tempFilename, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tempFilename, filename)
+
+        for oldFilename in os.listdir(CACHEDIR):
+            if oldFilename.startswith(f"{name}-") and oldFilename.endswith(".pickle") and \
+                    len(oldFilename) == len(filename) - len(CACHEDIR) - 1 and \
+                    f"{CACHEDIR}/{oldFilename}" != filename:
+                os.remove(f"{CACHEDIR}/{oldFilename}")
+    except Exception as e:
+        log(f"Could not write cache file {filename}: {e}", "WARNING")
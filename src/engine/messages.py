@@ -1,3 +1,5 @@
+import builtins
+
 import engine.log
 from engine.log import log
 
@@ -29,6 +31,10 @@ class Messages:
 
     All Request messages have a corresponding Reply message. The Request is sent to the
     server and the server returns the reply message or an Error message.
+
+    messageDefinitions is compiled into one validator per message type when Messages is created.
+    A subclass that changes messageDefinitions after calling super().__init__() must call
+    compileMessageDefinitions() again.
     """
 
     def __init__(self):
@@ -52,11 +58,18 @@ class Messages:
             'step': {
                 'gameSec': 'float',
                 'mapName': 'str',
+                'stepNumber': 'int',
                 'layerVisabilityMask': 'int',
                 'sprites': 'list',
+                'baseStepNumber_o': 'int',
+                'delSpriteIDs_o': 'list',
                 'actionText_o': 'str',
                 'marqueeText_o': 'str'
                 },
+            'stepAck': {
+                'mapName': 'str',
+                'stepNumber': 'int'
+                },
             'testTogglePlayerMoveChecking': {},
             'testPlayerNextMap': {},
             'testPlayerJump': {
@@ -67,6 +80,14 @@ class Messages:
                 'result': 'str'
                 },
 
+            # Part of a msg that was too large to send in one datagram (see engine.network.Socket.sendFragments())
+            'fragment': {
+                'fragmentID': 'int',
+                'fragmentNumber': ['int', 0, 999],
+                'fragmentCount': ['int', 2, 1000],
+                'data': 'bytes'
+                },
+
             # The message types below are not for game play
             # They are used only for connection setup through the connector.
             'addServer': {
@@ -98,9 +119,82 @@ class Messages:
             'udpPunchThrough': {}
             }
 
+        self.compileMessageDefinitions()
+
     def __str__(self):
         return engine.log.objectToStr(self)
 
+    def compileMessageDefinitions(self):
+        # build a validator for each msg type in messageDefinitions so isValidMsg() does not need to parse them.
+        self.validators = {}
+        for msgtype, msgspec in self.messageDefinitions.items():
+            self.validators[msgtype] = self.compileMsgSpec(msgtype, msgspec)
+
+    def compileMsgSpec(self, msgtype, msgspec):
+        '''
+        Return a function that returns True if a msg of type msgtype has the fields defined by msgspec,
+        otherwise it logs why the msg is not valid and returns False.
+        '''
+        fields = []
+        # msgId and replyData are always optional and have no specific format. So they are always valid if present.
+        allowedFields = {'type', 'msgID', 'replyData'}
+        for fld, fldspec in msgspec.items():
+            optional = fld.endswith('_o')
+            if optional:
+                # remove magic suffix marking field as optional
+                fld = fld[:-2]
+            if isinstance(fldspec, list):
+                typeName, minValue, maxValue = fldspec
+            else:
+                typeName, minValue, maxValue = fldspec, None, None
+            # typeName is either '<type>' or '(<type>,<type>,...)'
+            types = tuple(getattr(builtins, t.strip()) for t in typeName.strip('()').split(',') if t.strip())
+            fields.append((fld, optional, types, typeName, minValue, maxValue))
+            allowedFields.add(fld)
+        fields = tuple(fields)
+
+        def validator(msg):
+            for fld, optional, types, typeName, minValue, maxValue in fields:
+                if fld not in msg:
+                    if optional:
+                        # optional field is not present, which is valid.
+                        continue
+                    log("Msg does not contain required '" + fld + "' key: " + str(msg), "ERROR")
+                    return False
+                value = msg[fld]
+                if not isinstance(value, types):
+                    log("Msg '" + fld + "' key has value of type " + str(type(value)) +
+                        " but expected " + typeName + ": " + str(msg), "ERROR")
+                    return False
+                if minValue is not None:
+                    if typeName == 'str':
+                        if len(value) < minValue or len(value) > maxValue:
+                            log("Msg '" + fld + "' key has a string value " + str(value) +
+                                " with length out of range [" + str(minValue) + "," +
+                                str(maxValue) + "] : " + str(msg), "ERROR")
+                            return False
+                    elif value < minValue or value > maxValue:
+                        log("Msg '" + fld + "' key has a value " + str(value) +
+                            " which is out of range [" + str(minValue) + "," +
+                            str(maxValue) + "] : " + str(msg), "ERROR")
+                        return False
+
+            if not allowedFields.issuperset(msg):
+                # message has fields it should not have.
+                unvalidedFields = [fld for fld in msg if fld not in allowedFields]
+                log("Msg contains field(s) " + str(unvalidedFields) +
+                    " which is not defined for message type " + msgtype + ": " + str(msg), "ERROR")
+                for fld in unvalidedFields:
+                    if fld.endswith('_o'):
+                        log("Optional message fields should not include '_o' suffix in field name.", "WARNING")
+                        break
+                return False
+
+            # message is valid and has no extra fields.
+            return True
+
+        return validator
+
     def isValidMsg(self, msg):
         """ Returns True if msg is a valid message as defined by messageDefinitions, otherwise returns false. """
 
@@ -111,61 +205,10 @@ class Messages:
             log("Msg does not contain 'type' key: " + str(msg), "ERROR")
             return False
 
-        unvalidedFields = list(msg.keys())
-        # type is validated below as part of loop so does not need specific validation.
-        unvalidedFields.remove('type')
-        # msgId and replyData are always optional and have no specific format. So they are always valid if present.
-        if 'msgID' in unvalidedFields:
-            unvalidedFields.remove('msgID')
-        if 'replyData' in unvalidedFields:
-            unvalidedFields.remove('replyData')
-
-        for msgtype, msgspec in self.messageDefinitions.items():
-            if msgtype == msg['type']:
-                for fld, fldspec in msgspec.items():
-                    if fld.endswith('_o'):
-                        # remove magic suffix marking field as optional
-                        fld = fld.rstrip('_o')
-                        if fld not in msg:
-                            # optional field is not present, which is valid.
-                            continue
-                    elif fld not in msg:
-                        log("Msg does not contain required '" + fld + "' key: " + str(msg), "ERROR")
-                        return False
-                    if isinstance(fldspec, list):
-                        if not isinstance(msg[fld], eval(fldspec[0])):
-                            log("Msg '" + fld + "' key has value of type " + str(type(msg[fld])) +
-                                " but expected " + fldspec[0] + ": " + str(msg), "ERROR")
-                            return False
-                        if fldspec[0] is 'str':
-                            if len(msg[fld]) < fldspec[1] or len(msg[fld]) > fldspec[2]:
-                                log("Msg '" + fld + "' key has a string value " + str(msg[fld]) +
-                                    " with length out of range [" + str(fldspec[1]) + "," +
-                                    str(fldspec[2]) + "] : " + str(msg), "ERROR")
-                                return False
-                        elif msg[fld] < fldspec[1] or msg[fld] > fldspec[2]:
-                            log("Msg '" + fld + "' key has a value " + str(msg[fld]) +
-                                " which is out of range [" + str(fldspec[1]) + "," +
-                                str(fldspec[2]) + "] : " + str(msg), "ERROR")
-                            return False
-                    else:
-                        if not isinstance(msg[fld], eval(fldspec)):
-                            log("Msg '" + fld + "' key has value of type " + str(type(msg[fld])) +
-                                " but expected " + fldspec + ": " + str(msg), "ERROR")
-                            return False
-                    unvalidedFields.remove(fld)
-                # All fields defined for message type have now been examined and are valid
-                if len(unvalidedFields):
-                    # message has fields it should not have.
-                    log("Msg contains field(s) " + str(unvalidedFields) +
-                        " which is not defined for message type " + msg['type'] + ": " + str(msg), "ERROR")
-                    for fld in unvalidedFields:
-                        if fld.endswith('_o'):
-                            log("Optional message fields should not include '_o' suffix in field name.", "WARNING")
-                            break
-                    return False
-                else:
-                    # message is valid and has no extra fields.
-                    return True
-        log("Msg 'type' key has value '" + str(msg['type']) + "' which is not known: " + str(msg), "ERROR")
-        return False
+        validator = None
+        if isinstance(msg['type'], str):
+            validator = self.validators.get(msg['type'])
+        if validator is None:
+            log("Msg 'type' key has value '" + str(msg['type']) + "' which is not known: " + str(msg), "ERROR")
+            return False
+        return validator(msg)
@@ -0,0 +1,150 @@
+import math
+
+# numpy is optional. Without it engine.servermap.ServerMap moves sprites one at a time.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class MoveColumns:
+    '''
+    The MoveColumns class is responsible for moving many sprites of one map in a single vectorized pass.
+
+    The anchor, destination, and speed of each moving sprite are copied into numpy arrays (one array per key,
+    one row per sprite) along with a list mapping each row back to its sprite. The new direction and location
+    of every sprite are then computed with numpy, checked against the map's walkable data with
+    ServerMap.checkMoves(), and written back to the sprites.
+
+    The result is the same as calling ServerMap.moveSprite() for each sprite, except numpy may round some
+    results differently in the last bit than the math module does. It is only worth the setup cost
+    when many sprites are moving (see ServerMap.MOVE_COLUMNS_MIN_SPRITES).
+    '''
+
+    def __init__(self, capacity=64):
+        self.sprites = []  # the sprite in each row of the arrays below.
+        self.setCapacity(capacity)
+
+    def setCapacity(self, capacity):
+        # (re)allocate the arrays so they can hold capacity rows. Existing rows are not kept.
+        self.capacity = capacity
+        self.anchorX = numpy.zeros(capacity)
+        self.anchorY = numpy.zeros(capacity)
+        self.moveDestX = numpy.zeros(capacity)
+        self.moveDestY = numpy.zeros(capacity)
+        self.moveSpeed = numpy.zeros(capacity)
+
+    def load(self, sprites):
+        '''
+        Copy sprites that are moving (have moveDestX, moveDestY, and moveSpeed) into the arrays and return the
+        number of rows used. Sprites that are not moving are left out.
+        '''
+        self.sprites = [
+            s for s in sprites if "moveDestX" in s.props and "moveDestY" in s.props and "moveSpeed" in s.props]
+        rows = len(self.sprites)
+        if rows > self.capacity:
+            self.setCapacity(max(rows, self.capacity * 2))
+        self.anchorX[:rows] = [s.anchorX for s in self.sprites]
+        self.anchorY[:rows] = [s.anchorY for s in self.sprites]
+        self.moveDestX[:rows] = [s.props["moveDestX"] for s in self.sprites]
+        self.moveDestY[:rows] = [s.props["moveDestY"] for s in self.sprites]
+        self.moveSpeed[:rows] = [s.props["moveSpeed"] for s in self.sprites]
+        return rows
+
+    def move(self, map, sprites, fps):
+        # move sprites on map one step. See ServerMap.moveSprite() for what happens to each sprite.
+        rows = self.load(sprites)
+        if rows == 0:
+            return
+        anchorX = self.anchorX[:rows]
+        anchorY = self.anchorY[:rows]
+
+        # convert pixels per second to pixels per step
+        stepSpeed = self.moveSpeed[:rows] / fps
+
+        # compute a new angle in radians which moves directly towards destination (see geo.angle())
+        direction = numpy.arctan2(self.moveDestY[:rows] - anchorY, self.moveDestX[:rows] - anchorX)
+        direction[direction < 0] += math.pi * 2
+        direction[direction >= math.pi * 2] -= math.pi * 2
+
+        # compute a new anchor x,y which moves directly towards destination for this step (see geo.project())
+        newAnchorX = anchorX + stepSpeed * numpy.cos(direction)
+        newAnchorY = anchorY + stepSpeed * numpy.sin(direction)
+
+        # movement is only allowed if it is inbounds. Try moving directly towards destination, then only
+        # along X, and then only along Y.
+        allRows = numpy.arange(rows)
+        direct = map.checkMoves(allRows, newAnchorX, newAnchorY)
+
+        alongX = numpy.zeros(rows, dtype=bool)
+        tryX = ~direct & (newAnchorX != anchorX)
+        if tryX.any():
+            alongX[tryX] = map.checkMoves(allRows[tryX], newAnchorX[tryX], anchorY[tryX])
+
+        alongY = numpy.zeros(rows, dtype=bool)
+        tryY = ~direct & ~alongX & (newAnchorY != anchorY)
+        if tryY.any():
+            alongY[tryY] = map.checkMoves(allRows[tryY], anchorX[tryY], newAnchorY[tryY])
+
+        inBounds = direct | alongX | alongY
+        newAnchorX = numpy.where(alongY, anchorX, newAnchorX)
+        newAnchorY = numpy.where(alongX, anchorY, newAnchorY)
+
+        # stop sprites that cannot move, would move less than 0.1 pixel, or are close to their destination.
+        stop = ~inBounds | \
+            (numpy.sqrt((newAnchorX - anchorX)**2 + (newAnchorY - anchorY)**2) < 0.1) | \
+            (numpy.sqrt((self.moveDestX[:rows] - newAnchorX)**2 + (self.moveDestY[:rows] - newAnchorY)**2) < stepSpeed)
+
+        # write results back to the sprites.
+        for sprite, d, s, i, x, y in zip(
+                self.sprites, direction.tolist(), stop.tolist(), inBounds.tolist(),
+                newAnchorX.tolist(), newAnchorY.tolist()):
+            sprite.props["direction"] = d
+            map.setObjectChanged(sprite)
+            if s:
+                map.delSpriteDest(sprite)
+            if i:
+                map.setObjectLocationByAnchor(sprite, x, y)
+
+    def isWalkable(self, map, xs, ys):
+        # vectorized map.isWalkable(x, y). Return a numpy bool array with one value for each x, y in xs, ys.
+        result = numpy.zeros(len(xs), dtype=bool)
+        onMap = (xs >= 0) & (ys >= 0) & (xs <= map.pixelWidth) & (ys <= map.pixelHeight)
+        cellSize = map.walkableCellSize
+        cells = (ys[onMap] // cellSize).astype(numpy.intp) * map.walkableWidth + \
+            (xs[onMap] // cellSize).astype(numpy.intp)
+        values = numpy.frombuffer(map.walkable, dtype=numpy.uint8)[cells]
+        result[onMap] = values == map.WALKABLE
+
+        # points in cells that contain an edge must be checked against the objects themselves.
+        # Checking all points against each object is faster than checking each point with map.isWalkable()
+        # only if there are more points than objects.
+        check = numpy.flatnonzero(onMap)[values == map.CHECKWALKABLE]
+        if len(check) > len(map.inBounds) + len(map.outOfBounds):
+            checkXs = xs[check]
+            checkYs = ys[check]
+            result[check] = self.objectsContain(map.inBounds, checkXs, checkYs) | \
+                ~self.objectsContain(map.outOfBounds, checkXs, checkYs)
+        else:
+            for i in check.tolist():
+                result[i] = map.isWalkable(xs[i], ys[i])
+        return result
+
+    def objectsContain(self, objectList, xs, ys):
+        # vectorized geo.objectsContains(). Return a numpy bool array with one value for each x, y in xs, ys.
+        result = numpy.zeros(len(xs), dtype=bool)
+        for object in objectList:
+            if "ellipse" in object.props:
+                pass  # not yet supported (see geo.objectContains())
+            elif "point" in object.props:
+                result |= (xs == object.x) & (ys == object.y)
+            else:
+                result |= (object.x <= xs) & (xs <= object.x + object.width) & \
+                    (object.y <= ys) & (ys <= object.y + object.height)
+        return result
+
+    def checkEach(self, checkMove, rows, xs, ys):
+        # return a numpy bool array of checkMove(sprite, x, y) for the sprite in each row of rows.
+        return numpy.array(
+            [checkMove(self.sprites[row], x, y) for row, x, y in zip(rows.tolist(), xs.tolist(), ys.tolist())],
+            dtype=bool)
@@ -1,5 +1,7 @@
 import socket
+import selectors
 import random
+import math
 import engine.time as time
 import re
 import argparse
@@ -20,7 +22,7 @@ class Socket:
     """
 
     def __init__(self, messages, msgProcessor, sourceIP, sourcePort,
-                 sourcePortSearch=False, destinationIP='127.0.0.1', destinationPort=20000):
+                 sourcePortSearch=False, destinationIP='127.0.0.1', destinationPort=20000, checkSendMsgs=True):
         """
         Create and bind UDP socket and bind it to listen on sourceIP and sourcePort.
 
@@ -28,6 +30,7 @@ class Socket:
         sourceIP: IP the socket will listen on. This must be 127.0.0.1 (locahost), 0.0.0.0 (all interfaces), or a valid IP address on the computer.
         sourcePort: port to listen on. This is an integer number.
         destinationIP and destinationPort are stored with setDestinationAddress()
+        checkSendMsgs: if False then msgs are not validated before being sent. Received msgs are always validated.
 
 
         Returns Socket object.
@@ -36,6 +39,7 @@ class Socket:
         """
 
         self.messages = messages
+        self.checkSendMsgs = checkSendMsgs
         self.msgProcessor = msgProcessor
         self.msgProcessorMethods = [func for func in dir(self.msgProcessor) if callable(
             getattr(self.msgProcessor, func)) and func.startswith('msg')]
@@ -51,9 +55,18 @@ class Socket:
         self.sendRecvMessageTime = 0  # Total time in sendRecvMessage
         self.sendTypes = {}
         self.recvTypes = {}
+        self.fragmentsSent = 0  # Number of fragment datagrams sent to OS socket
+        self.fragmentsRecv = 0  # Number of fragment datagrams recv from OS socket
+        self.fragmentsDropped = 0  # Number of incomplete fragmented msgs dropped after fragmentTimeout
+        self.recvInvalid = 0  # Number of invalid datagrams skipped by recvReplyMsgs
+        self.recvBudgetReached = 0  # Number of times recvReplyMsgs stopped because it reached the recv budget
 
         self.sendrecvDelay = 0.1
 
+        # max msgs and microseconds recvReplyMsgs may spend receiving msgs in one call. (see setRecvBudget())
+        self.recvBudgetMsgs = 500
+        self.recvBudgetMicroseconds = 5000
+
         self.sourceIP = sourceIP
         log("Creating socket with sourceIP=" + sourceIP + ", sourcePort=" + str(sourcePort), "VERBOSE")
         self.s = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
@@ -77,12 +90,25 @@ class Socket:
             log("Source Socket Binding Failed. The source port(s) may already be in use.", "FAILURE")
             raise
         self.s.settimeout(0)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.s, selectors.EVENT_READ)
+        self.spinTime = 0.001  # secs at the end of recvReplyMsgsUntil() that are busy waited for accuracy.
         self.destinationIP = resolve(destinationIP)
         self.destinationPort = destinationPort
         self.bufferSize = 4096
+        self.packer = msgpack.Packer(use_bin_type=True)
         random.seed()
         self.msgID = random.randrange(0, 65000, 1)
 
+        # Serialized msgs longer than fragmentSize are sent as several fragment msgs and reassembled by the receiver.
+        # 1400 bytes of msg data per fragment keeps each datagram within a typical 1500 byte Ethernet MTU.
+        self.fragmentSize = 1400
+        # the most fragments a msg can be split into, set by the fragmentCount limit of the fragment msg spec.
+        self.maxFragments = self.messages.messageDefinitions['fragment']['fragmentCount'][2]
+        self.fragmentTimeout = 1.0  # secs to wait for all fragments of a msg before dropping it.
+        self.fragmentID = random.randrange(0, 65000, 1)
+        self.fragments = {}  # incomplete fragmented msgs, indexed by (ipport, fragmentID)
+
     def __str__(self):
         return engine.log.objectToStr(self)
 
@@ -92,6 +118,14 @@ class Socket:
     def setDelay(self, delay):
         self.sendrecvDelay = delay
 
+    def setRecvBudget(self, maxMsgs, maxMicroseconds):
+        '''
+        Limit how many msgs and how much time one call to recvReplyMsgs() may spend receiving msgs.
+        Msgs left in the receive buffer are processed by the next call.
+        '''
+        self.recvBudgetMsgs = maxMsgs
+        self.recvBudgetMicroseconds = maxMicroseconds
+
     def getStats(self):
         """ Return str of Socket stats. """
         output = "\n\n                 ====== Stats ======"
@@ -103,6 +137,17 @@ class Socket:
                 "\n  Avg sendRecvMessage Time: " + \
                 '%.6f' % (self.sendRecvMessageTime / self.sendRecvMessageCalls) + " secs."
 
+        if self.fragmentsSent or self.fragmentsRecv:
+            output += \
+                "\n            Fragments Sent: " + str(self.fragmentsSent) + \
+                "\n            Fragments Recv: " + str(self.fragmentsRecv) + \
+                "\n   Fragmented Msgs Dropped: " + str(self.fragmentsDropped)
+
+        if self.recvInvalid or self.recvBudgetReached:
+            output += \
+                "\n     Invalid Datagrams Recv: " + str(self.recvInvalid) + \
+                "\n  Recv Budget Reached Count: " + str(self.recvBudgetReached)
+
         for ipport in self.sent.keys():
             output += "\n\n               === To/From: " + ipport + " ==="\
                 "\n             Messages Sent: " + str(self.sent[ipport]) +\
@@ -145,6 +190,26 @@ class Socket:
     def deserialize(self, b):
         return msgpack.unpackb(b, raw=False)
 
+    def serializeFields(self, fields):
+        '''
+        Return a list of serialized key/value pairs, one for each item in dict fields.
+
+        Serialized fields from several calls can be combined into one serialized msg with serializeMsg().
+        This allows parts of a msg that are shared by many msgs to be serialized only once.
+        '''
+        return [self.serialize(k) + self.serialize(v) for k, v in fields.items()]
+
+    def serializeList(self, serializedItems):
+        # Return a serialized list made from items that have each already been serialized.
+        return self.packer.pack_array_header(len(serializedItems)) + b''.join(serializedItems)
+
+    def serializeMsg(self, *serializedFieldLists):
+        # Return a serialized msg (dict) made from one or more lists returned by serializeFields().
+        count = 0
+        for serializedFields in serializedFieldLists:
+            count += len(serializedFields)
+        return self.packer.pack_map_header(count) + b''.join([b''.join(f) for f in serializedFieldLists])
+
     def sendMessage(self, msg, destinationIP=None, destinationPort=None, packedAndChecked=False):
         """
         Sends msg to destinationIP:destinationPort and then returns immediately.
@@ -154,6 +219,7 @@ class Socket:
 
         msg must be a valid message (see Messages below). Raises
         SocketException exception if the msg does not have a valid format.
+        The msg format is not checked if the Socket was created with checkSendMsgs=False.
 
         If destinationIP or destinationPort is not provided then the default will
         be used (see setDestinationAddress()).
@@ -171,7 +237,7 @@ class Socket:
             destinationPort = self.destinationPort
 
         if not packedAndChecked:
-            if not self.messages.isValidMsg(msg):
+            if self.checkSendMsgs and not self.messages.isValidMsg(msg):
                 raise SocketException("Could not send because msg is not valid format.")
             if not isValidIP(destinationIP):
                 raise SocketException("Could not send because destinationIP is not valid.")
@@ -183,9 +249,13 @@ class Socket:
         else:
             networkbytes = msg
 
-        log("Sending msg to " + destinationIP + ":" + str(destinationPort) +
-            " len=" + str(len(networkbytes)) + " bytes " + str(msg), "DEBUG")
-        self.s.sendto(networkbytes, (destinationIP, destinationPort))
+        if engine.log.LOGDEBUG:
+            log("Sending msg to " + destinationIP + ":" + str(destinationPort) +
+                " len=" + str(len(networkbytes)) + " bytes " + str(msg), "DEBUG")
+        if len(networkbytes) > self.fragmentSize:
+            self.sendFragments(networkbytes, destinationIP, destinationPort)
+        else:
+            self.s.sendto(networkbytes, (destinationIP, destinationPort))
 
         dest = formatIpPort(destinationIP, destinationPort)
         if dest in self.sent:
@@ -205,6 +275,70 @@ class Socket:
         else:
             self.sendTypes[dest][msgtype] = 1
 
+    def sendFragments(self, networkbytes, destinationIP, destinationPort):
+        '''
+        Split networkbytes (a serialized msg) into fragment msgs that each carry at most fragmentSize
+        bytes and send them all. The receiver reassembles the original msg in recvFragment().
+
+        Raises SocketException, without sending anything, if the msg needs more than maxFragments fragments
+        since the receiver would reject the fragments as invalid.
+        '''
+        fragmentCount = math.ceil(len(networkbytes) / self.fragmentSize)
+        if fragmentCount > self.maxFragments:
+            raise SocketException(
+                f"Could not send because msg is {len(networkbytes)} bytes which is more than the "
+                f"{self.maxFragments * self.fragmentSize} bytes that can be sent in {self.maxFragments} fragments.")
+
+        self.fragmentID = self.fragmentID + 1
+        if self.fragmentID > 65000:
+            self.fragmentID = 0
+
+        for fragmentNumber in range(fragmentCount):
+            start = fragmentNumber * self.fragmentSize
+            self.s.sendto(self.serialize({
+                'type': 'fragment',
+                'fragmentID': self.fragmentID,
+                'fragmentNumber': fragmentNumber,
+                'fragmentCount': fragmentCount,
+                'data': networkbytes[start:start + self.fragmentSize]
+                }), (destinationIP, destinationPort))
+        self.fragmentsSent += fragmentCount
+
+    def recvFragment(self, ipport, fragment):
+        '''
+        Store fragment and return the reassembled serialized msg if all fragments of the msg have now
+        been received, else return None.
+
+        Fragmented msgs that are not complete within fragmentTimeout secs are dropped.
+        '''
+        self.fragmentsRecv += 1
+        currentTime = time.perf_counter()
+
+        # drop any fragmented msgs that have timed out.
+        for key in [key for key, f in self.fragments.items() if f['dropAfter'] < currentTime]:
+            log(f"Dropping incomplete fragmented msg {key}.", "VERBOSE")
+            del self.fragments[key]
+            self.fragmentsDropped += 1
+
+        key = (ipport, fragment['fragmentID'])
+        if key not in self.fragments:
+            self.fragments[key] = {
+                'fragmentCount': fragment['fragmentCount'],
+                'dropAfter': currentTime + self.fragmentTimeout,
+                'data': {}
+                }
+        f = self.fragments[key]
+        if f['fragmentCount'] != fragment['fragmentCount'] or fragment['fragmentNumber'] >= f['fragmentCount']:
+            log(f"Fragment does not match other fragments of msg {key}.", "WARNING")
+            return None
+
+        f['data'][fragment['fragmentNumber']] = fragment['data']
+        if len(f['data']) < f['fragmentCount']:
+            return None
+
+        del self.fragments[key]
+        return b''.join([f['data'][i] for i in range(f['fragmentCount'])])
+
     def recvMessage(self):
         """
         Check the socket receive buffer and returns message, ip, and port only
@@ -220,25 +354,52 @@ class Socket:
         If the reply is an “Error” message then it will be returned just like
         any other message. No exception will be raised.
 
+        Fragments of large messages (see sendFragments()) are consumed until the
+        message they belong to is complete, and then the complete message is returned.
+
         If msg is not a valid message (see Messages below) then raises
         SocketException.
 
-        Immediately raises SocketException if the receive buffer is empty.
+        Immediately raises SocketBufferEmptyException, a subclass of SocketException,
+        if the receive buffer is empty.
 
         Note, the text above assumes the socket timeout is set to 0
         (non-blocking), which is the default in Socket.
 
         """
         try:
-            bytesAddressPair = self.s.recvfrom(self.bufferSize)
-            # Convert data from network binary format to python objects
-            msg = self.deserialize(bytesAddressPair[0])
-            ip = bytesAddressPair[1][0]
-            port = bytesAddressPair[1][1]
-            log("Received msg from " + ip + ":" + str(port) + " len=" +
-                str(len(bytesAddressPair[0])) + " bytes " + str(msg), "DEBUG")
+            msg = None
+            while msg is None:
+                bytesAddressPair = self.s.recvfrom(self.bufferSize)
+                networkbytes = bytesAddressPair[0]
+                ip = bytesAddressPair[1][0]
+                port = bytesAddressPair[1][1]
+                ipport = formatIpPort(ip, port)
+
+                # Convert data from network binary format to python objects
+                try:
+                    msg = self.deserialize(networkbytes)
+
+                    if isinstance(msg, dict) and msg.get('type') == 'fragment':
+                        if not self.messages.isValidMsg(msg):
+                            raise SocketException("Received fragment invalid format.")
+                        networkbytes = self.recvFragment(ipport, msg)
+                        if networkbytes is None:
+                            # msg is not complete yet so keep reading the receive buffer.
+                            msg = None
+                        else:
+                            msg = self.deserialize(networkbytes)
+                except (ValueError, TypeError, msgpack.UnpackException) as e:
+                    log(f"Could not deserialize msg from {ipport}: {e}", "WARNING")
+                    raise SocketException("Received message invalid format.")
+
+            if engine.log.LOGDEBUG:
+                log("Received msg from " + ip + ":" + str(port) + " len=" +
+                    str(len(networkbytes)) + " bytes " + str(msg), "DEBUG")
+
+            if not self.messages.isValidMsg(msg):
+                raise SocketException("Received message invalid format.")
 
-            ipport = formatIpPort(ip, port)
             if ipport in self.recv:
                 self.recv[ipport] += 1
             else:
@@ -253,16 +414,13 @@ class Socket:
 
         except (BlockingIOError, socket.timeout):
             # There was no data in the receive buffer.
-            raise SocketException("Receive buffer empty.")
+            raise SocketBufferEmptyException("Receive buffer empty.")
         except (ConnectionResetError):
             # Windows raises this when it gets back an ICMP destination unreachable packet
             log("The destination ip:port returned ICMP destination unreachable. Is the destination running?", "WARNING")
             raise SocketException(
                 "The destination ip:port returned ICMP destination unreachable. Is the destination running?")
 
-        if not self.messages.isValidMsg(msg):
-            raise SocketException("Received message invalid format.")
-
         return msg, ip, port
 
     def sendRecvMessage(self, msg, destinationIP=None, destinationPort=None,
@@ -354,21 +512,34 @@ class Socket:
         return replyMsg
 
     def recvReplyMsgs(self):
-        # process all messages in socket recv buffer
-        # for each msg send it to callbackFunc(ipport, msg, callbackData)
-        # if the callback function return a msg then send the msg back
+        '''
+        Process msgs in socket recv buffer, up to the limits set with setRecvBudget().
+        For each msg call msgProcessor.msg<msgType>(ip, port, ipport, msg).
+        If the msg<msgType> method returns a msg then send the msg back.
+
+        Invalid datagrams are counted and skipped. Msgs that did not fit within the
+        budget are left in the recv buffer for the next call.
+        '''
         msgQ = []
-        more = True
-        while more:
+        received = 0  # valid and invalid msgs received
+        stopAt = time.perf_counter() + self.recvBudgetMicroseconds / 1000000
+        while True:
+            if received >= self.recvBudgetMsgs or time.perf_counter() > stopAt:
+                self.recvBudgetReached += 1
+                log(f"recvReplyMsgs budget reached after {received} msgs.", "VERBOSE")
+                break
+            received += 1
             try:
                 msgQ.append(self.recvMessage())
+            except SocketBufferEmptyException:
+                break
             except SocketException as e:
-                # BUG this assumes this exception is only thrown if buffer is
-                # empty but it is also thrown if an invalid msg is received.
-                more = False
+                # invalid msg or ICMP error. The datagram has been consumed so skip it and keep going.
+                self.recvInvalid += 1
+                log(str(e), "VERBOSE")
             except Exception as e:
                 log(str(type(e)) + " " + str(e), "ERROR")
-                more = False
+                self.recvInvalid += 1
 
         for msg, ip, port in msgQ:
             methodName = "msg" + msg["type"][:1].capitalize() + msg["type"][1:]
@@ -388,11 +559,41 @@ class Socket:
                 except Exception as e:
                     log(str(e), "ERROR")
 
+    def recvReplyMsgsUntil(self, stopAt):
+        '''
+        Sleep until time.perf_counter() reaches stopAt, calling recvReplyMsgs() as soon as msgs arrive.
+
+        The OS wakes the process when the socket is readable or the time is up so no CPU is used while
+        waiting. The last spinTime secs are busy waited since OS sleeps are not accurate enough.
+
+        Returns the number of secs spent idle (sleeping or busy waiting, not processing msgs).
+        '''
+        idleTime = 0
+        ptime = time.perf_counter()
+        while stopAt - ptime > self.spinTime:
+            ready = self.selector.select(stopAt - ptime - self.spinTime)
+            idleTime += time.perf_counter() - ptime
+            if ready:
+                self.recvReplyMsgs()
+            ptime = time.perf_counter()
+
+        spinStart = ptime
+        while ptime < stopAt:
+            ptime = time.perf_counter()
+        idleTime += ptime - spinStart
+
+        return idleTime
+
 
 class SocketException(Exception):
     """Raised by the Socket class."""
     pass
 
+
+class SocketBufferEmptyException(SocketException):
+    """Raised by Socket.recvMessage() when there is no msg in the receive buffer."""
+    pass
+
 ########################################################
 # Network Utility Functions
 ########################################################
@@ -0,0 +1,88 @@
+class ObjectList:
+    '''
+    The ObjectList class stores the objects (engine.sprite.Sprite) of one Tiled object layer, in order.
+
+    Objects are stored in a dict by id(object) so append(), remove(), and "object in objectList" take the same
+    time no matter how many objects are in the list, rather than checking every object like a Python list.
+    Each object can only be in an ObjectList once. Appending an object that is already in the list does nothing.
+
+    Looping over an ObjectList loops over the objects that were in it when the loop started, so objects can be
+    added and removed during the loop. The objects are copied into a tuple for looping only after the list has
+    changed so loops are as fast as looping over a Python list.
+
+    ObjectList supports the parts of the Python list API used with object lists: len(), in, objectList[i],
+    objectList[:] = objects, +, append(), remove(), extend(), clear(), and sort().
+    '''
+
+    __slots__ = ("objects", "snapshot")
+
+    def __init__(self, objects=()):
+        self.objects = {}  # {id(object): object} in the order objects were added.
+        self.snapshot = None  # tuple of the objects, or None if the list has changed since it was made.
+        self.extend(objects)
+
+    def __repr__(self):
+        return repr(list(self.objects.values()))
+
+    def __getstate__(self):
+        # objects will have new ids once unpickled so only save the objects.
+        return list(self.objects.values())
+
+    def __setstate__(self, objects):
+        self.objects = {}
+        self.snapshot = None
+        self.extend(objects)
+
+    def getSnapshot(self):
+        if self.snapshot is None:
+            self.snapshot = tuple(self.objects.values())
+        return self.snapshot
+
+    def __iter__(self):
+        return iter(self.getSnapshot())
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __contains__(self, object):
+        return id(object) in self.objects
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self.getSnapshot()[index])
+        return self.getSnapshot()[index]
+
+    def __setitem__(self, index, objects):
+        # only objectList[:] = objects is supported, which replaces all objects.
+        if index != slice(None):
+            raise TypeError("ObjectList only supports replacing all objects with objectList[:] = objects")
+        self.clear()
+        self.extend(objects)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def append(self, object):
+        if id(object) not in self.objects:
+            self.objects[id(object)] = object
+            self.snapshot = None
+
+    def remove(self, object):
+        if id(object) not in self.objects:
+            raise ValueError("ObjectList.remove(object): object not in list")
+        del self.objects[id(object)]
+        self.snapshot = None
+
+    def extend(self, objects):
+        for object in objects:
+            self.append(object)
+
+    def clear(self):
+        self.objects = {}
+        self.snapshot = None
+
+    def sort(self, key=None, reverse=False):
+        self[:] = sorted(self.getSnapshot(), key=key, reverse=reverse)
@@ -7,11 +7,13 @@ from engine.log import log
 import engine.log
 import engine.network
 import engine.loaders
+import engine.lazymaps
 
 
 def quit(signal=None, frame=None):
     try:
         log(engine.server.SERVER.socket.getStats())
+        engine.server.SERVER.logStepMethodStats()
     except BaseException:
         pass
     log("Quiting", "INFO")
@@ -43,9 +45,14 @@ class Server:
         self.fps = args.fps
         self.pause = args.pause
         self.testMode = args.testMode
+        self.checkSendMsgs = args.checkSendMsgs
+        self.profileStepMethods = args.profileStepMethods
+        self.unloadMapsAfter = args.unloadMapsAfter
 
         self.playerMoveCheck = True
         self.CONNECTOR_KEEP_ALIVE = 10  # send a keepalive to connector every 10 secs until all players have joined.
+        self.STEP_HISTORY = 60  # number of past steps per map kept as baselines for delta step msgs.
+        self.MAX_CATCH_UP_STEPS = 5  # max steps run back to back when the server falls behind.
 
         if(self.testMode):
             log("Server running in TEST MODE.")
@@ -54,6 +61,12 @@ class Server:
         self.playersByNum = {}  # same as above but indexed by playerNumber
         self.gameStartSec = 0  # time_perfcounter() that the game started (send in step msgs)
 
+        # Step snapshots used to send players only the sprites that changed since the last step they acked.
+        self.nextSpriteID = 1  # unique id given to each sprite so clients can match sprites between steps.
+        self.stepNumbers = {}  # latest stepNumber for each map, indexed by mapName.
+        self.stepSnapshots = {}  # {mapName: {stepNumber: {spriteID: serialized sprite}}}
+        self.stepSnapshotVersions = {}  # map.changeVersion when the latest snapshot was taken, indexed by mapName.
+
         # set up networking
         try:
             log(f"Server Default IP: {engine.network.getDefaultIP()}")
@@ -65,7 +78,8 @@ class Server:
                 messages=engine.loaders.loadModule("messages", game=self.game).Messages(),
                 msgProcessor=self,
                 sourceIP=self.serverIP,
-                sourcePort=self.serverPort
+                sourcePort=self.serverPort,
+                checkSendMsgs=self.checkSendMsgs
                 )
             log("Network socket created.")
 
@@ -93,24 +107,33 @@ class Server:
             loadImages=False  # Server does not need to render images so save memory and don't load them.
             )
 
-        self.maps = engine.loaders.loadMaps(
+        if self.profileStepMethods:
+            log("Step method profiling is on.")
+
+        # maps are loaded when they are first used and unloaded after they have been idle for a while.
+        self.maps = engine.lazymaps.LazyMaps(
             tilesets=self.tilesets,
             game=self.game,
-            maptype="ServerMap"
+            maptype="ServerMap",
+            unloadAfter=self.unloadMapsAfter,
+            mapLoaded=self.initMap
             )
 
         # find player starting locations. Number of locations determines how many players can play game.
-        self.unassignedPlayerSprites = []  # List of player sprites that have not been assigned to any client yet.
-        for m in self.maps:
-            for player in self.maps[m].sprites:
-                if player["type"] == "player":
-                    self.unassignedPlayerSprites.append((player, self.maps[m].name))
+        # Only the map files are read so maps are not loaded until a player is assigned a sprite on them.
+        # List of the map name of each player sprite that has not been assigned to any client yet.
+        self.unassignedPlayerMapNames = self.maps.findObjectMapNames("player")
         # ensure players are assigned random player sprites even if they join in the same order.
-        random.shuffle(self.unassignedPlayerSprites)
+        random.shuffle(self.unassignedPlayerMapNames)
 
     def __str__(self):
         return engine.log.objectToStr(self)
 
+    def initMap(self, map):
+        # called by self.maps each time a map is loaded.
+        if self.profileStepMethods:
+            map.setStepMethodProfiling(True)
+
     ########################################################
     # MAIN LOOP
     ########################################################
@@ -118,42 +141,93 @@ class Server:
     def run(self):
         '''
         Run the loop below once every  1/fps seconds.
+
+        Steps are scheduled on a fixed timeline (step n is due at n/fps secs after the server started) so
+        a slow step does not shift the time of all later steps. If the server falls behind then it runs
+        several steps in a row to catch up, but at most MAX_CATCH_UP_STEPS at a time. Any steps still
+        overdue after that are skipped.
         '''
 
         startAt = time.perf_counter()
         nextStatusAt = startAt + 10
-        sleepTime = 0
-        nextStepAt = startAt + (1.0 / self.fps)
+        idleTime = 0
+
+        stepDuration = 1.0 / self.fps
+        scheduleStartAt = startAt  # time step 0 was due.
+        stepNumber = 0  # number of the next step to run.
+        self.resetStepTimingStats()
         while True:
             # process messages from server (recvReplyMsgs calls msg<msgType> for each msg received)
             self.socket.recvReplyMsgs()
 
-            # Run the game logic to move everything forward one step
-            self.stepServer()
-
-            # Send updates to players for maps that have changed during the step
+            # Run the game logic to move everything forward one step for each step that is due.
+            stepsRun = 0
+            ptime = time.perf_counter()
+            while ptime >= scheduleStartAt + stepNumber * stepDuration and stepsRun < self.MAX_CATCH_UP_STEPS:
+                self.addStepLateness(ptime - (scheduleStartAt + stepNumber * stepDuration))
+                self.stepServer()
+                stepNumber += 1
+                stepsRun += 1
+                ptime = time.perf_counter()
+            if stepsRun > 1:
+                self.stepTimingStats["catchUpSteps"] += stepsRun - 1
+
+            # if we are still behind then give up on the steps we could not catch up on.
+            if ptime >= scheduleStartAt + stepNumber * stepDuration:
+                skip = int((ptime - scheduleStartAt) / stepDuration) + 1 - stepNumber
+                stepNumber += skip
+                self.stepTimingStats["skippedSteps"] += skip
+                log(f"Server running slower than {self.fps} fps. Skipped {skip} steps.", "VERBOSE")
+
+            # Send updates to players for maps that have changed during the step(s)
             self.sendStepMsgs()
 
             # send keep alive messages to connector
             self.sendConnectorKeepAlive()
 
-            # busy wait (for accuracy) until next step should start.
             ptime = time.perf_counter()
-            if ptime < nextStepAt:
-                sleepTime += nextStepAt - ptime
-
-                if ptime > nextStatusAt:
-                    # log the amount of time we are busy vs. waiting for the next step.
-                    log(f"Status: busy == {int(100-(sleepTime/(ptime-startAt)*100))}%")
-                    startAt = ptime
-                    nextStatusAt = startAt + 10
-                    sleepTime = 0
-                while ptime < nextStepAt:
-                    ptime = time.perf_counter()
-            else:
-                log("Server running slower than " + str(self.fps) + " fps.", "VERBOSE")
+            if ptime > nextStatusAt:
+                # log the amount of time we are busy vs. idle waiting for the next step.
+                log(f"Status: busy == {int(100-(idleTime/(ptime-startAt)*100))}%, {self.getStepTimingStats()}")
+                self.logStepMethodStats()
+                startAt = ptime
+                nextStatusAt = startAt + 10
+                idleTime = 0
+                self.resetStepTimingStats()
+
+            # sleep (processing msgs as they arrive) until next step should start.
+            idleTime += self.socket.recvReplyMsgsUntil(scheduleStartAt + stepNumber * stepDuration)
+
+    def resetStepTimingStats(self):
+        self.stepTimingStats = {
+            "steps": 0,  # number of steps run
+            "totalLateness": 0,  # total secs steps started after they were due
+            "maxLateness": 0,  # max secs a step started after it was due
+            "catchUpSteps": 0,  # number of steps run back to back to catch up
+            "skippedSteps": 0  # number of steps skipped because server was too far behind
+            }
 
-            nextStepAt = ptime + (1.0 / self.fps)
+    def addStepLateness(self, lateness):
+        self.stepTimingStats["steps"] += 1
+        self.stepTimingStats["totalLateness"] += lateness
+        if lateness > self.stepTimingStats["maxLateness"]:
+            self.stepTimingStats["maxLateness"] = lateness
+
+    def getStepTimingStats(self):
+        # return step timing stats as a str
+        stats = self.stepTimingStats
+        avgLateness = 0
+        if stats["steps"]:
+            avgLateness = stats["totalLateness"] / stats["steps"]
+        return f"steps == {stats['steps']}, " + \
+            f"lateness avg/max == {avgLateness * 1000:.2f}/{stats['maxLateness'] * 1000:.2f} ms, " + \
+            f"catch up steps == {stats['catchUpSteps']}, skipped steps == {stats['skippedSteps']}"
+
+    def logStepMethodStats(self):
+        # log step method stats of each loaded map, if step method profiling is on.
+        if self.profileStepMethods:
+            for map in self.maps.loaded.values():
+                log(map.getStepMethodStats())
 
     ########################################################
     # Network Message Processing
@@ -170,7 +244,7 @@ class Server:
             result = f"Client and Server are not running the same game: client->{msg['game']}, server->{self.game}"
             log("Player at " + ipport + " tried to join wrong game.")
         else:
-            if len(self.unassignedPlayerSprites) == 0:
+            if len(self.unassignedPlayerMapNames) == 0:
                 result = "Game is full. No more players can join."
                 log("Player from " + ipport + " tried to join full game.")
             else:
@@ -180,7 +254,7 @@ class Server:
 
         if result == "OK":
             # if using connector and all players have joined we can delServer from connector
-            if self.registerName and len(self.unassignedPlayerSprites) == 0:
+            if self.registerName and len(self.unassignedPlayerMapNames) == 0:
                 self.socket.sendMessage(
                     {
                         'type': 'delServer',
@@ -214,6 +288,15 @@ class Server:
             map.setSpriteAction(sprite)
         return False
 
+    def msgStepAck(self, ip, port, ipport, msg):
+        # remember the latest step the player has received so it can be used as the baseline for delta step msgs.
+        if ipport in self.players:  # if this is a player who has already joined the game
+            player = self.players[ipport]
+            if player["stepAckMapName"] != msg["mapName"] or player["stepAckNumber"] < msg["stepNumber"]:
+                player["stepAckMapName"] = msg["mapName"]
+                player["stepAckNumber"] = msg["stepNumber"]
+        return False
+
     def msgTestPlayerJump(self, ip, port, ipport, msg):
         if ipport in self.players:  # if this is a player who has already joined the game
             if self.testMode:
@@ -255,39 +338,150 @@ class Server:
 
     def sendStepMsgs(self):
         # If the player has changed or map the player is on has changed then send that player a step message.
+
+        # take a new snapshot of each changed map that has players on it.
+        for mapName in sorted(set([player["sprite"].mapName for player in self.players.values()])):
+            if self.maps[mapName].changeVersion != self.stepSnapshotVersions.get(mapName):
+                self.addStepSnapshot(self.maps[mapName])
+
+        # serialized step msg parts are only reused within one step.
+        self.stepMsgCache = {}
+
         for ipport in self.players:
             player = self.players[ipport]
-            map = self.maps[player["sprite"]["mapName"]]
+            map = self.maps[player["sprite"].mapName]
             if map.changed or self.getPlayerChanged(player):
                 self.socket.sendMessage(
                     self.getStepMsg(player),
                     destinationIP=self.players[ipport]["ip"],
-                    destinationPort=self.players[ipport]["port"]
+                    destinationPort=self.players[ipport]["port"],
+                    packedAndChecked=True
                     )
             # reset the change detection on player.
             self.resetPlayerChanged(self.players[ipport])
 
-        # reset the change detection on all maps
-        for mapName in self.maps:
-            self.maps[mapName].setMapChanged(False)
+        # reset the change detection on all loaded maps
+        for map in self.maps.loaded.values():
+            map.setMapChanged(False)
 
     def getStepMsg(self, player):
-        map = self.maps[player["sprite"]["mapName"]]
+        '''
+        Return the step msg for player, already serialized and checked (see Socket.sendMessage()).
+
+        The fields that are the same for all players on a map with the same baseline are serialized once
+        per step and reused. Only the player specific fields (actionText and marqueeText) are serialized
+        for each player.
+        '''
+        map = self.maps[player["sprite"].mapName]
+        baseline = self.getStepBaseline(player)
+        if baseline is None:
+            cacheKey = (map.name, None)
+        else:
+            cacheKey = (map.name, player["stepAckNumber"])
+        if cacheKey not in self.stepMsgCache:
+            self.stepMsgCache[cacheKey] = self.getMapStepMsgFields(map, baseline, player["stepAckNumber"])
+
+        playerFields = {}
+        if player["actionText"]:
+            playerFields["actionText"] = player["actionText"]
+
+        if player["marqueeText"]:
+            playerFields["marqueeText"] = player["marqueeText"]
+
+        return self.socket.serializeMsg(self.stepMsgCache[cacheKey], self.socket.serializeFields(playerFields))
+
+    def getMapStepMsgFields(self, map, baseline, baseStepNumber):
+        '''
+        Return the serialized fields of a step msg for map that are not player specific.
+
+        If baseline is None then all sprites are included, otherwise only sprites that were added or changed,
+        and the ids of sprites removed, since baseline.
+        '''
+        stepNumber = self.stepNumbers[map.name]
+        snapshot = self.stepSnapshots[map.name][stepNumber]
         msg = {
             'type': 'step',
             'gameSec': time.perf_counter() - self.gameStartSec,
             'mapName': map.name,
-            'layerVisabilityMask': map.getLayerVisablityMask(),
-            'sprites': map.sprites
+            'stepNumber': stepNumber,
+            'layerVisabilityMask': map.getLayerVisablityMask()
             }
 
-        if player["actionText"]:
-            msg["actionText"] = player["actionText"]
+        if baseline is None:
+            # player does not have a usable baseline so send all sprites.
+            sprites = list(map.sprites)
+        else:
+            sprites = [s for s in map.sprites if baseline.get(s.spriteID) != snapshot[s.spriteID]]
+            msg['baseStepNumber'] = baseStepNumber
+            msg['delSpriteIDs'] = [spriteID for spriteID in baseline if spriteID not in snapshot]
 
-        if player["marqueeText"]:
-            msg["marqueeText"] = player["marqueeText"]
+        if self.checkSendMsgs:
+            msg['sprites'] = sprites
+            if not self.socket.messages.isValidMsg(msg):
+                raise engine.network.SocketException("Could not send because step msg is not valid format.")
+            del msg['sprites']
 
-        return msg
+        # sprites were already serialized when the snapshot was taken so reuse those bytes.
+        return self.socket.serializeFields(msg) + [
+            self.socket.serialize('sprites') + self.socket.serializeList([snapshot[s.spriteID] for s in sprites])
+            ]
+
+    ########################################################
+    # STEP SNAPSHOTS (baselines for delta step msgs)
+    ########################################################
+
+    def addStepSnapshot(self, map):
+        '''
+        Record the current state of map's sprites as a new step. Each sprite is stored in serialized form
+        so it can be compared cheaply with the same sprite in a later step.
+
+        Only sprites flagged with map.setObjectChanged() since the last snapshot, or not in the last snapshot,
+        are serialized again. All other sprites reuse their bytes from the last snapshot. Keys in
+        map.serverOnlySpriteKeys are not included.
+        '''
+        lastSnapshot = {}
+        if map.name in self.stepSnapshots:
+            lastSnapshot = self.stepSnapshots[map.name][self.stepNumbers[map.name]]
+        changedObjects = map.changedObjects
+        serverOnlySpriteKeys = map.serverOnlySpriteKeys
+
+        snapshot = {}
+        for sprite in map.sprites:
+            if not hasattr(sprite, "spriteID"):
+                sprite.spriteID = self.nextSpriteID
+                self.nextSpriteID += 1
+            spriteID = sprite.spriteID
+            if spriteID in lastSnapshot and id(sprite) not in changedObjects:
+                snapshot[spriteID] = lastSnapshot[spriteID]
+            else:
+                snapshot[spriteID] = self.socket.serialize(sprite.toDict(exclude=serverOnlySpriteKeys))
+        map.delChangedObjects()
+        self.stepSnapshotVersions[map.name] = map.changeVersion
+
+        stepNumber = self.stepNumbers.get(map.name, 0) + 1
+        self.stepNumbers[map.name] = stepNumber
+        if map.name not in self.stepSnapshots:
+            self.stepSnapshots[map.name] = {}
+        self.stepSnapshots[map.name][stepNumber] = snapshot
+
+        # forget steps that are too old to be used as a baseline.
+        if stepNumber - self.STEP_HISTORY in self.stepSnapshots[map.name]:
+            del self.stepSnapshots[map.name][stepNumber - self.STEP_HISTORY]
+
+    def delStepSnapshots(self, mapName):
+        # forget all snapshots of mapName. stepNumbers is kept so step numbers of mapName keep increasing.
+        self.stepSnapshots.pop(mapName, None)
+        self.stepSnapshotVersions.pop(mapName, None)
+
+    def getStepBaseline(self, player):
+        '''
+        Return the snapshot of the last step the player acked, or None if the player has not acked a step on
+        the map they are now on or the step is too old and no longer in the history.
+        '''
+        mapName = player["sprite"].mapName
+        if player["stepAckMapName"] != mapName or mapName not in self.stepSnapshots:
+            return None
+        return self.stepSnapshots[mapName].get(player["stepAckNumber"])
 
     ########################################################
     # Network Message Processing for Connector
@@ -322,7 +516,7 @@ class Server:
         # if we are still waiting for players to join then
         # we need to keep udp punch through open for traffic from connector
         # we need to make sure connector does not time out our registration.
-        if self.registerName and len(self.unassignedPlayerSprites) != 0:
+        if self.registerName and len(self.unassignedPlayerMapNames) != 0:
             if self.sendAddServerAfter < time.perf_counter():
                 self.socket.sendMessage(
                     self.getAddServerMsg(),
@@ -355,7 +549,7 @@ class Server:
         # find mapNames that have at least one player on them.
         mapNames = []
         for ipport in self.players:
-            mapNames.append(self.players[ipport]["sprite"]["mapName"])
+            mapNames.append(self.players[ipport]["sprite"].mapName)
 
         # set() removes duplicates and sorted() ensures we process maps in the same order each time.
         mapNames = sorted(set(mapNames))
@@ -366,6 +560,10 @@ class Server:
 
         self.stepServerEnd()
 
+        # release maps that have not been used for a while. Their step snapshots are no longer needed.
+        for mapName in self.maps.unloadIdleMaps(mapNames):
+            self.delStepSnapshots(mapName)
+
     def stepServerStart(self):
         '''
         perform any game logic for the start of a step that is not map specific.
@@ -383,10 +581,13 @@ class Server:
 
     def addPlayer(self, ip, port, ipport, msg):
         # add the client to the game.
-        sprite, mapName = self.unassignedPlayerSprites.pop()
+        mapName = self.unassignedPlayerMapNames.pop()
+        # use any player sprite on the map that has not been assigned to a client yet.
+        sprite = random.choice([
+            s for s in self.maps[mapName].findObject(type="player", returnAll=True) if "playerNumber" not in s])
 
         # add player data to sprite
-        sprite["playerNumber"] = len(self.unassignedPlayerSprites) + 1
+        sprite["playerNumber"] = len(self.unassignedPlayerMapNames) + 1
         sprite["mapName"] = mapName
         # add playerDisplaName to sprite as "labelText" so client can display it.
         sprite["labelText"] = msg['playerDisplayName']
@@ -399,13 +600,15 @@ class Server:
             'actionText': False,
             'lastActionText': False,
             'marqueeText': False,
-            'lastMarqueeText': False
+            'lastMarqueeText': False,
+            'stepAckMapName': False,  # map and step number of the last step msg the player received.
+            'stepAckNumber': 0
             }
         # Also add player to self.playersByNum with the playerNumber so we can look up either way.
         self.playersByNum[sprite["playerNumber"]] = self.players[ipport]
 
-        # The sprite so the map needs to be sent to all players
-        self.maps[mapName].setMapChanged()
+        # The sprite has changed so the map needs to be sent to all players
+        self.maps[mapName].setObjectChanged(sprite)
 
         log(f"Player named {msg['playerDisplayName']} from {ipport} joined the game.")
 
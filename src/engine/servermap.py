@@ -1,9 +1,14 @@
+import math
+import collections
+
 from engine.log import log
 import engine.map
 import engine.geometry as geo
 import engine.time as time
 import engine.stepmap
 import engine.server
+import engine.movecolumns
+import engine.sprite
 
 
 class ServerMap(engine.stepmap.StepMap):
@@ -11,6 +16,40 @@ class ServerMap(engine.stepmap.StepMap):
     The ServerMap class is responsible for implementing several basic game mechanics.
     '''
 
+    def __init__(self, tilesets, mapDir):
+        self.walkable = None  # see setWalkable()
+        self.delFlowFields()
+
+        # sprite keys that are only used by the server so they are not sent to clients. See addServerOnlySpriteKeys()
+        self.serverOnlySpriteKeys = set(("moveDestX", "moveDestY", "action", "speechTextDelAfter"))
+
+        # if numpy is installed then move sprites with engine.movecolumns when at least MOVE_COLUMNS_MIN_SPRITES
+        # sprites are moving. See stepMove()
+        self.MOVE_COLUMNS_MIN_SPRITES = 32
+        self.moveColumns = None
+        if engine.movecolumns.numpy is not None:
+            self.moveColumns = engine.movecolumns.MoveColumns()
+        self.checkMovesUsesCheckMove = self.getCheckMovesUsesCheckMove()
+        super().__init__(tilesets, mapDir)
+
+        # build walkable after init methods have had a chance to change inBounds and outOfBounds.
+        self.setWalkable()
+
+        for sprite in self.sprites:
+            self.setSpriteActiveByKeys(sprite)
+            if "speechText" in sprite:
+                self.setSpeechTextTimer(sprite)
+
+    def __getstate__(self):
+        # walkableRects is keyed by id() so it is rebuilt by __setstate__()
+        state = super().__getstate__()
+        del state["walkableRects"]
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.walkableRects = {id(object): self.getWalkableRect(object) for object in self.inBounds + self.outOfBounds}
+
     ########################################################
     # MECHANIC TEMPLATE
     ########################################################
@@ -25,8 +64,16 @@ class ServerMap(engine.stepmap.StepMap):
     def stepSpriteStartName(sprite):
         pass
 
-    def triggerName(sprite):
-        # called when an object on the trigger layer with type="name" is triggered by a sprite entering it's rect.
+    def triggerEnterName(trigger, sprite):
+        # called when a sprite enters the rect of an object on the trigger layer with type="name".
+        pass
+
+    def triggerName(trigger, sprite):
+        # called on every step a sprite is inside the rect of an object on the trigger layer with type="name".
+        pass
+
+    def triggerExitName(trigger, sprite):
+        # called when a sprite leaves the rect of an object on the trigger layer with type="name".
         pass
 
     def stepMoveName(sprite):
@@ -39,49 +86,96 @@ class ServerMap(engine.stepmap.StepMap):
         pass
     '''
 
+    ########################################################
+    # SERVER ONLY SPRITE KEYS
+    ########################################################
+
+    def addServerOnlySpriteKeys(self, *keys):
+        '''
+        Used by init* methods to declare sprite keys that are only used by the server. These keys are not sent to
+        clients and changing them does not require a call to setObjectChanged().
+        '''
+        self.serverOnlySpriteKeys.update(keys)
+
     ########################################################
     # STEP MOVE
     ########################################################
 
+    def setSpriteActiveByKeys(self, sprite):
+        # mark sprite as active for the step methods that use stepSpriteActive() if sprite needs them.
+        if "moveDestX" in sprite:
+            self.setSpriteActive(sprite, "move")
+
     def setSpriteDest(self, sprite, moveDestX, moveDestY, moveSpeed):
         # flag a sprite as wanting to move to a new location at a specific moveSpeed.
         # Normally set in a player sprite after the server receives a playerMove message from the client.
         sprite["moveDestX"] = moveDestX
         sprite["moveDestY"] = moveDestY
-        sprite["moveSpeed"] = moveSpeed
+        # moveSpeed is sent to clients so they can show the sprite moving.
+        if sprite.get("moveSpeed") != moveSpeed:
+            sprite["moveSpeed"] = moveSpeed
+            self.setObjectChanged(sprite)
+        self.setSpriteActive(sprite, "move")
 
     def delSpriteDest(self, sprite):
         # stop a sprite from moving
-        if "moveDestX" in sprite:
-            del sprite["moveDestX"]
-        if "moveDestY" in sprite:
-            del sprite["moveDestY"]
-        if "moveSpeed" in sprite:
-            del sprite["moveSpeed"]
+        props = sprite.props
+        if "moveDestX" in props:
+            del props["moveDestX"]
+        if "moveDestY" in props:
+            del props["moveDestY"]
+        if "moveSpeed" in props:
+            del props["moveSpeed"]
+            self.setObjectChanged(sprite)
+        self.delSpriteActive(sprite, "move")
+
+    @engine.stepmap.stepSpriteBatch
+    @engine.stepmap.stepSpriteActive("move")
+    def stepMove(self, sprites):
+        '''
+        Move sprites set to move by setSpriteDest(). Many sprites are moved together with self.moveColumns.
+
+        Note, stepMove() is called once per step with all the moving sprites (see engine.stepmap.stepSpriteBatch)
+        rather than once for each sprite, and the per sprite move is now moveSprite(sprite). For code written for
+        the old stepMove(sprite), a single sprite may still be passed, and a subclass that overrides stepMove()
+        without the stepSpriteBatch decorator is still called once for each sprite.
+        '''
+        if isinstance(sprites, engine.sprite.Sprite):
+            sprites = (sprites,)
+        if self.moveColumns is not None and len(sprites) >= self.MOVE_COLUMNS_MIN_SPRITES:
+            self.moveColumns.move(self, sprites, engine.server.SERVER.fps)
+        else:
+            for sprite in sprites:
+                self.moveSprite(sprite)
+
+    def moveSprite(self, sprite):
+        # Move sprite within this map while respecting inBounds and outOfBounds.
 
-    def stepMove(self, sprite):
-        # Move sprite within this map while respecting inBounds and outOfBounds
+        # the move keys are not sprite slots so read them from props directly.
+        props = sprite.props
 
         # if sprite is moving
-        if "moveDestX" in sprite and "moveDestY" in sprite and "moveSpeed" in sprite:
+        if "moveDestX" in props and "moveDestY" in props and "moveSpeed" in props:
+            anchorX, anchorY = sprite.anchorX, sprite.anchorY
 
             # convert pixels per second to pixels per step
-            stepSpeed = sprite["moveSpeed"] / engine.server.SERVER.fps
+            stepSpeed = props["moveSpeed"] / engine.server.SERVER.fps
 
             # compute a new angle in radians which moves directly towards destination
             # sprite["direction"] is stored and never removed so client will know the last
             # direction the sprite was facing.
-            sprite["direction"] = geo.angle(
-                sprite["anchorX"],
-                sprite["anchorY"],
-                sprite["moveDestX"],
-                sprite["moveDestY"])
+            props["direction"] = geo.angle(
+                anchorX,
+                anchorY,
+                props["moveDestX"],
+                props["moveDestY"])
+            self.setObjectChanged(sprite)
 
             # compute a new anchor x,y which moves directly towards destination for this step
             newAnchorX, newAnchorY = geo.project(
-                sprite["anchorX"],
-                sprite["anchorY"],
-                sprite["direction"],
+                anchorX,
+                anchorY,
+                props["direction"],
                 stepSpeed
                 )
 
@@ -92,19 +186,19 @@ class ServerMap(engine.stepmap.StepMap):
             if self.checkMove(sprite, newAnchorX, newAnchorY):
                 inBounds = True
             # elif sprite is moving along X then try to stay at the same Y and move along only along X
-            elif newAnchorX != sprite["anchorX"] and self.checkMove(sprite, newAnchorX, sprite["anchorY"]):
-                newAnchorY = sprite["anchorY"]
+            elif newAnchorX != anchorX and self.checkMove(sprite, newAnchorX, anchorY):
+                newAnchorY = anchorY
                 inBounds = True
             # elif sprite is moving along Y then try to stay at the same X and move along only along Y
-            elif newAnchorY != sprite["anchorY"] and self.checkMove(sprite, sprite["anchorX"], newAnchorY):
-                newAnchorX = sprite["anchorX"]
+            elif newAnchorY != anchorY and self.checkMove(sprite, anchorX, newAnchorY):
+                newAnchorX = anchorX
                 inBounds = True
 
             if inBounds:
-                if geo.distance(sprite["anchorX"], sprite["anchorY"], newAnchorX, newAnchorY) < 0.1:
+                if geo.distance(anchorX, anchorY, newAnchorX, newAnchorY) < 0.1:
                     # if sprite is only going to move less than 0.1 pixel then stop it.
                     self.delSpriteDest(sprite)
-                elif geo.distance(newAnchorX, newAnchorY, sprite["moveDestX"], sprite["moveDestY"]) < stepSpeed:
+                elif geo.distance(newAnchorX, newAnchorY, props["moveDestX"], props["moveDestY"]) < stepSpeed:
                     # if sprite is close to destination then stop it.
                     self.delSpriteDest(sprite)
 
@@ -130,13 +224,286 @@ class ServerMap(engine.stepmap.StepMap):
 
         '''
         # if move player move checking has been turned off then allow all moves for players
-        if object["type"] == 'player' and not engine.server.SERVER.playerMoveCheck:
+        if object.type == "player" and not engine.server.SERVER.playerMoveCheck:
             return True
 
-        if geo.objectContains({"x": 0, "y": 0, "width": self.pixelWidth, "height": self.pixelHeight}, x, y) and \
-                (geo.objectsContains(self.inBounds, x, y) or (not geo.objectsContains(self.outOfBounds, x, y))):
-            return True
-        return False
+        return self.isWalkable(x, y)
+
+    def checkMoves(self, rows, xs, ys):
+        '''
+        Vectorized checkMove() used by self.moveColumns. Return a numpy bool array with checkMove(sprite, x, y)
+        for the sprite in each row of self.moveColumns in rows and each x, y in xs, ys.
+
+        A subclass that overrides checkMove() should also override checkMoves(), otherwise checkMove() is
+        called for each sprite.
+        '''
+        if self.checkMovesUsesCheckMove:
+            return self.moveColumns.checkEach(self.checkMove, rows, xs, ys)
+
+        result = self.moveColumns.isWalkable(self, xs, ys)
+        # if move player move checking has been turned off then allow all moves for players
+        if not engine.server.SERVER.playerMoveCheck:
+            sprites = self.moveColumns.sprites
+            for i, row in enumerate(rows.tolist()):
+                if sprites[row].type == "player":
+                    result[i] = True
+        return result
+
+    def getCheckMovesUsesCheckMove(self):
+        # return True if checkMove() is overridden by a subclass of the class that last overrides checkMoves().
+        checkMoveClass = next(c for c in type(self).__mro__ if "checkMove" in c.__dict__)
+        checkMovesClass = next(c for c in type(self).__mro__ if "checkMoves" in c.__dict__)
+        return checkMoveClass is not checkMovesClass and issubclass(checkMoveClass, checkMovesClass)
+
+    ########################################################
+    # WALKABLE
+    ########################################################
+    '''
+    The map size, inBounds layer, and outOfBounds layer are rasterized into self.walkable so checkMove() can
+    usually decide if a point is inbounds with one lookup. self.walkable is a bytearray with one byte for each
+    square cell of walkableCellSize pixels:
+        WALKABLE: every point in the cell is inbounds
+        NOTWALKABLE: every point in the cell is out of bounds
+        CHECKWALKABLE: the cell contains an edge of an inBounds or outOfBounds object so points in the
+            cell must be checked against the objects themselves.
+    '''
+
+    NOTWALKABLE = 0
+    WALKABLE = 1
+    CHECKWALKABLE = 2
+
+    def setWalkable(self, rect=False):
+        '''
+        Rasterize inBounds and outOfBounds into self.walkable. If rect (an object or dict with x, y, width,
+        and height) is provided then only the cells rect overlaps are updated.
+
+        self.walkableRects = {id(object): rect} records the rect each inBounds and outOfBounds object was
+        rasterized at so only the cells under its old and new rect need to be updated when it moves.
+        '''
+        if self.walkable is None:
+            self.walkableCellSize = max(1, min(self.tilewidth, self.tileheight) // 4)
+            # add one extra cell so points on the right and bottom edge of the map are in a cell.
+            self.walkableWidth = self.pixelWidth // self.walkableCellSize + 1
+            self.walkableHeight = self.pixelHeight // self.walkableCellSize + 1
+            self.walkable = bytearray(self.walkableWidth * self.walkableHeight)
+            rect = False
+
+        # flow fields are built from walkable so they will be out of date.
+        self.delFlowFields()
+
+        cellSize = self.walkableCellSize
+        if rect:
+            x1 = max(0, math.floor(rect["x"] / cellSize) - 1)
+            y1 = max(0, math.floor(rect["y"] / cellSize) - 1)
+            x2 = min(self.walkableWidth - 1, math.floor((rect["x"] + rect["width"]) / cellSize))
+            y2 = min(self.walkableHeight - 1, math.floor((rect["y"] + rect["height"]) / cellSize))
+            if x1 > x2 or y1 > y2:
+                return
+        else:
+            x1, y1, x2, y2 = 0, 0, self.walkableWidth - 1, self.walkableHeight - 1
+            self.walkableRects = {
+                id(object): self.getWalkableRect(object) for object in self.inBounds + self.outOfBounds}
+        width = x2 - x1 + 1
+
+        # for each cell in the area, record if any inBounds/outOfBounds object covers all or part of the cell.
+        # Cells are treated as closed rects (including their right and bottom edges) to match geo.objectContains().
+        inFull = bytearray(width * (y2 - y1 + 1))
+        inPart = bytearray(len(inFull))
+        outFull = bytearray(len(inFull))
+        outPart = bytearray(len(inFull))
+        for objectList, full, part in ((self.inBounds, inFull, inPart), (self.outOfBounds, outFull, outPart)):
+            for object in objectList:
+                if "ellipse" in object:
+                    continue  # geo.objectContains() does not support ellipses so they never contain a point.
+                left = object["x"] / cellSize
+                top = object["y"] / cellSize
+                right = (object["x"] + object["width"]) / cellSize
+                bottom = (object["y"] + object["height"]) / cellSize
+                for cellY in range(max(y1, math.ceil(top - 1)), min(y2, math.floor(bottom)) + 1):
+                    fullY = top <= cellY and cellY + 1 <= bottom
+                    for cellX in range(max(x1, math.ceil(left - 1)), min(x2, math.floor(right)) + 1):
+                        i = (cellY - y1) * width + cellX - x1
+                        part[i] = 1
+                        if fullY and left <= cellX and cellX + 1 <= right:
+                            full[i] = 1
+
+        for cellY in range(y1, y2 + 1):
+            for cellX in range(x1, x2 + 1):
+                i = (cellY - y1) * width + cellX - x1
+                if inFull[i] or not outPart[i]:
+                    value = self.WALKABLE
+                elif outFull[i] and not inPart[i]:
+                    value = self.NOTWALKABLE
+                else:
+                    value = self.CHECKWALKABLE
+                self.walkable[cellY * self.walkableWidth + cellX] = value
+
+    def getWalkableRect(self, object):
+        return {"x": object["x"], "y": object["y"], "width": object["width"], "height": object["height"]}
+
+    def isWalkable(self, x, y):
+        # return True if x, y is on the map and inbounds (see checkMove()).
+        if x < 0 or y < 0 or x > self.pixelWidth or y > self.pixelHeight:
+            return False
+
+        value = self.walkable[int(y // self.walkableCellSize) * self.walkableWidth + int(x // self.walkableCellSize)]
+        if value == self.CHECKWALKABLE:
+            return len(self.objectGrids[id(self.inBounds)].findObjects(x, y)) > 0 or \
+                len(self.objectGrids[id(self.outOfBounds)].findObjects(x, y)) == 0
+        return value == self.WALKABLE
+
+    def addObject(self, object, objectList=False):
+        super().addObject(object, objectList)
+        if self.walkable is not None and (objectList is self.inBounds or objectList is self.outOfBounds):
+            self.walkableRects[id(object)] = self.getWalkableRect(object)
+            self.setWalkable(object)
+        if not self.isObjectList(objectList) or objectList is self.sprites:
+            # sprite may have been moving or talking on another map.
+            self.setSpriteActiveByKeys(object)
+            if "speechText" in object:
+                self.setSpeechTextTimer(object)
+
+    def removeObject(self, object, objectList=False):
+        super().removeObject(object, objectList)
+        if self.walkable is not None and (objectList is self.inBounds or objectList is self.outOfBounds):
+            if object not in self.inBounds and object not in self.outOfBounds:
+                self.walkableRects.pop(id(object), None)
+            self.setWalkable(object)
+        if not self.isObjectList(objectList) or objectList is self.sprites:
+            # speech text timer will be set again if sprite is added to a map.
+            self.delTimer(("speechText", id(object)))
+
+    def updateObjectGrids(self, object):
+        super().updateObjectGrids(object)
+        # if an inBounds or outOfBounds object has moved then update the cells under its old and new rect.
+        if self.walkable is not None and id(object) in self.walkableRects:
+            oldRect = self.walkableRects[id(object)]
+            rect = self.getWalkableRect(object)
+            if rect != oldRect:
+                self.walkableRects[id(object)] = rect
+                self.setWalkable(oldRect)
+                self.setWalkable(rect)
+
+    ########################################################
+    # FLOW FIELDS
+    ########################################################
+    '''
+    A flow field is the walking distance, in flow field cells, from every cell of the map to a target cell. Any
+    number of sprites chasing the same target can then find their next step with a few lookups by moving to a
+    neighbouring cell that is closer to the target (see getFlowFieldStep()).
+
+    Flow fields are cached by target cell so they are only built once for all sprites chasing the same target
+    and again only if the target moves to a different cell or the map's walkable data changes. Note, cells
+    that cannot be walked through still have neighbours so a sprite on the edge of an out of bounds area can
+    find its way back.
+    '''
+
+    # max number of flow fields (targets) to keep. The least recently used flow field is forgotten first.
+    FLOW_FIELD_CACHE_SIZE = 16
+
+    def delFlowFields(self):
+        # forget all flow fields. Called when walkable data changes.
+        # {targetCellIndex: [distance or -1 if not reachable, ...]} in order of least to most recently used.
+        self.flowFields = collections.OrderedDict()
+        self.flowFieldNeighbours = None  # see setFlowFieldNeighbours()
+
+    def setFlowFieldNeighbours(self):
+        '''
+        Set self.flowFieldNeighbours[cellIndex] to a tuple of the cells next to (including diagonally) cellIndex
+        that can be walked into from cellIndex, where cellIndex = cellY * self.flowFieldWidth + cellX.
+
+        Flow field cells are half a tile and a cell can be walked through if its center is walkable. Diagonal
+        moves are only allowed if both cells beside the diagonal can also be walked through so sprites do
+        not cut the corners of out of bounds areas.
+        '''
+        self.flowFieldCellSize = max(1, min(self.tilewidth, self.tileheight) // 2)
+        width = self.flowFieldWidth = self.pixelWidth // self.flowFieldCellSize + 1
+        height = self.flowFieldHeight = self.pixelHeight // self.flowFieldCellSize + 1
+        half = self.flowFieldCellSize / 2
+        walkable = bytearray(width * height)
+        for cellY in range(height):
+            for cellX in range(width):
+                if self.isWalkable(cellX * self.flowFieldCellSize + half, cellY * self.flowFieldCellSize + half):
+                    walkable[cellY * width + cellX] = 1
+
+        self.flowFieldNeighbours = []
+        for cellY in range(height):
+            for cellX in range(width):
+                neighbours = []
+                for dx, dy in ((0, -1), (1, 0), (0, 1), (-1, 0), (1, -1), (1, 1), (-1, 1), (-1, -1)):
+                    nx = cellX + dx
+                    ny = cellY + dy
+                    if nx < 0 or ny < 0 or nx >= width or ny >= height or not walkable[ny * width + nx]:
+                        continue
+                    if dx and dy and not (walkable[cellY * width + nx] and walkable[ny * width + cellX]):
+                        continue
+                    neighbours.append(ny * width + nx)
+                self.flowFieldNeighbours.append(tuple(neighbours))
+
+    def getFlowFieldCell(self, x, y):
+        # return the index of the flow field cell that contains x, y or False if x, y is not on the map.
+        cellX = int(x // self.flowFieldCellSize)
+        cellY = int(y // self.flowFieldCellSize)
+        if x < 0 or y < 0 or cellX >= self.flowFieldWidth or cellY >= self.flowFieldHeight:
+            return False
+        return cellY * self.flowFieldWidth + cellX
+
+    def getFlowField(self, targetCell):
+        # return the flow field for targetCell, building it if it is not in the cache.
+        if targetCell in self.flowFields:
+            self.flowFields.move_to_end(targetCell)
+            return self.flowFields[targetCell]
+
+        # breadth first search outwards from the target cell.
+        neighbours = self.flowFieldNeighbours
+        distances = [-1] * len(neighbours)
+        distances[targetCell] = 0
+        queue = collections.deque((targetCell,))
+        while queue:
+            cell = queue.popleft()
+            distance = distances[cell] + 1
+            for neighbour in neighbours[cell]:
+                if distances[neighbour] == -1:
+                    distances[neighbour] = distance
+                    queue.append(neighbour)
+
+        if len(self.flowFields) >= self.FLOW_FIELD_CACHE_SIZE:
+            self.flowFields.popitem(last=False)  # forget the least recently used flow field.
+        self.flowFields[targetCell] = distances
+        return distances
+
+    def getFlowFieldStep(self, x, y, targetX, targetY):
+        '''
+        return (stepX, stepY), the next point to move to when walking from x, y to targetX, targetY while
+        going around out of bounds areas. If x, y is already beside the target then the target itself is
+        returned. If there is no known path then False is returned.
+        '''
+        if self.flowFieldNeighbours is None:
+            self.setFlowFieldNeighbours()
+
+        cell = self.getFlowFieldCell(x, y)
+        targetCell = self.getFlowFieldCell(targetX, targetY)
+        if cell is False or targetCell is False:
+            return False
+
+        distances = self.getFlowField(targetCell)
+        distance = distances[cell]
+        if distance in (0, 1):
+            return (targetX, targetY)
+
+        # find the neighbouring cell that is closest to the target. If cell itself can not be walked through
+        # (eg. x, y is on the edge of an out of bounds area) then any reachable neighbour will do.
+        best = False
+        for neighbour in self.flowFieldNeighbours[cell]:
+            if distances[neighbour] != -1 and (distance == -1 or distances[neighbour] < distance):
+                if best is False or distances[neighbour] < distances[best]:
+                    best = neighbour
+        if best is False:
+            return False
+
+        half = self.flowFieldCellSize / 2
+        return ((best % self.flowFieldWidth) * self.flowFieldCellSize + half,
+                (best // self.flowFieldWidth) * self.flowFieldCellSize + half)
 
     ########################################################
     # MAPDOOR
@@ -152,10 +519,10 @@ class ServerMap(engine.stepmap.StepMap):
             log("Cannot process mapDoor trigger.", "ERROR")
             return
 
-        # find destination based on object named trigger["prop-destReference"] on
-        # layer "reference" of map trigger["prop-destMapName"]
+        # find destination based on object named trigger["prop-destReference"] on layer "reference" of map
+        # trigger["prop-destMapName"]. Use destMap.findObject() so the name index of destMap.reference is used.
         destMap = engine.server.SERVER.maps[trigger["prop-destMapName"]]
-        dest = self.findObject(name=trigger["prop-destReference"], objectList=destMap.reference)
+        dest = destMap.findObject(name=trigger["prop-destReference"], objectList=destMap.reference)
         if dest:
             self.setObjectMap(sprite, destMap)
             destMap.setObjectLocationByAnchor(sprite, dest["anchorX"], dest["anchorY"])
@@ -175,11 +542,13 @@ class ServerMap(engine.stepmap.StepMap):
         self.removeObject(holdable, objectList=self.sprites)
         self.removeObject(holdable, objectList=self.triggers)
         sprite["holding"] = holdable
+        self.setObjectChanged(sprite)
 
     def delHoldable(self, sprite):
         # delete holdable from sprite and "drop" holdable in same location as sprite.
         dropping = sprite["holding"]
         del sprite["holding"]
+        self.setObjectChanged(sprite)
 
         # put the dropped item at the feet of the sprite that was holding it.
         self.setObjectLocationByAnchor(dropping, sprite["anchorX"], sprite["anchorY"])
@@ -209,8 +578,8 @@ class ServerMap(engine.stepmap.StepMap):
     def stepSpriteEndHoldable(self, sprite):
         # dropping is not triggered. It only requires an unused action request so it needs to be checked for
         # during end of step sprite processing, after all triggers have had a chance to see that an action is requested.
-        if "holding" in sprite:
-            if "action" in sprite:
+        if "holding" in sprite.props:
+            if "action" in sprite.props:
                 self.delSpriteAction(sprite)
                 self.delHoldable(sprite)
             else:
@@ -230,8 +599,8 @@ class ServerMap(engine.stepmap.StepMap):
 
     def delSpriteAction(self, sprite):
         # clear sprite flag from sprite.
-        if "action" in sprite:
-            del sprite["action"]
+        if "action" in sprite.props:
+            del sprite.props["action"]
 
     def stepSpriteEndDelAction(self, sprite):
         # if an action was requested by no possible action was found during the step then just delete it.
@@ -249,8 +618,8 @@ class ServerMap(engine.stepmap.StepMap):
                 player["actionText"] = actionText
 
     def delSpriteActionText(self, sprite):
-        if sprite["type"] == "player" and "playerNumber" in sprite:
-            player = engine.server.SERVER.playersByNum[sprite["playerNumber"]]
+        if sprite.type == "player" and "playerNumber" in sprite.props:
+            player = engine.server.SERVER.playersByNum[sprite.props["playerNumber"]]
             if "actionText" in player:
                 player["actionText"] = False
 
@@ -264,24 +633,31 @@ class ServerMap(engine.stepmap.StepMap):
 
     def setSpriteSpeechText(self, sprite, speechText, speechTextDelAfter=0):
         old = False
-        if "speachText" in sprite:
+        if "speechText" in sprite:
             old = sprite["speechText"]
 
-        self.delSpriteSpeechText(sprite)
+        if "speechTextDelAfter" in sprite:
+            del sprite["speechTextDelAfter"]
         sprite["speechText"] = speechText
         if speechTextDelAfter > 0:
             sprite["speechTextDelAfter"] = speechTextDelAfter
+        self.setSpeechTextTimer(sprite)
 
         if old != sprite["speechText"]:
-            self.setMapChanged()
+            self.setObjectChanged(sprite)
 
     def delSpriteSpeechText(self, sprite):
         if "speechText" in sprite:
             del sprite["speechText"]
+            self.setObjectChanged(sprite)
         if "speechTextDelAfter" in sprite:
             del sprite["speechTextDelAfter"]
+        self.delTimer(("speechText", id(sprite)))
 
-    def stepSpriteStartSpeechTextTimers(self, sprite):
-        if "speechTextDelAfter" not in sprite or (
-                "speechTextDelAfter" in sprite and sprite["speechTextDelAfter"] < time.perf_counter()):
-            self.delSpriteSpeechText(sprite)
+    def setSpeechTextTimer(self, sprite):
+        # delete sprite's speechText after speechTextDelAfter or, if there is no speechTextDelAfter, at the
+        # start of the next step.
+        speechTextDelAfter = 0
+        if "speechTextDelAfter" in sprite:
+            speechTextDelAfter = sprite["speechTextDelAfter"]
+        self.setTimer(("speechText", id(sprite)), speechTextDelAfter, self.delSpriteSpeechText, sprite)
@@ -0,0 +1,250 @@
+import math
+
+import engine.log
+from engine.log import log
+import engine.geometry as geo
+
+
+class SpatialGrid:
+    '''
+    The SpatialGrid class is responsible for quickly finding the objects (engine.sprite.Sprite) of one object list
+    that contain a point.
+
+    The map area is divided into square cells of cellSize pixels. Each object is recorded in every cell
+    its rect overlaps so only the objects in the cell containing a point need to be checked with
+    geo.objectContains(), rather than every object in the list.
+
+    The grid must be told when objects are added, removed, or moved. engine.map.Map does this
+    for the object lists it indexes (see Map.addObject(), Map.removeObject(), and Map.setObjectLocationByXY()).
+    '''
+
+    def __init__(self, cellSize, objectList=()):
+        self.cellSize = cellSize
+        self.cells = {}  # {(cellX, cellY): {id(object): object, ...}, ...}
+
+        # {id(object): (order, cells)} where order is used to return objects in the order they were
+        # added and cells is a tuple of the cells the object is recorded in.
+        self.objects = {}
+        self.nextOrder = 0
+
+        # {(cellX, cellY): version} where version changes each time an object is added to, removed from, or
+        # moved within the cell. This lets callers cache findObjects() results. See getCellVersion()
+        self.cellVersions = {}
+        self.nextVersion = 1
+
+        for object in objectList:
+            self.add(object)
+
+    def __str__(self):
+        return engine.log.objectToStr(self)
+
+    def __contains__(self, object):
+        return id(object) in self.objects
+
+    def getCells(self, object):
+        # return a tuple of all cells that object's rect overlaps.
+        x1 = math.floor(object.x / self.cellSize)
+        y1 = math.floor(object.y / self.cellSize)
+        x2 = math.floor((object.x + object.width) / self.cellSize)
+        y2 = math.floor((object.y + object.height) / self.cellSize)
+        return tuple((cellX, cellY) for cellX in range(x1, x2 + 1) for cellY in range(y1, y2 + 1))
+
+    def getCellVersion(self, x, y):
+        # return the version of the cell containing x, y. If the version has not changed then findObjects(x, y)
+        # will return the same result as last time (assuming objects are not moved without calling update()).
+        return self.cellVersions.get((math.floor(x / self.cellSize), math.floor(y / self.cellSize)), 0)
+
+    def setCellsChanged(self, cells):
+        for cell in cells:
+            self.cellVersions[cell] = self.nextVersion
+        self.nextVersion += 1
+
+    def touch(self, object):
+        # mark the cells object is in as changed, for example, because object has changed type. Does nothing if
+        # object is not in grid.
+        if id(object) in self.objects:
+            self.setCellsChanged(self.objects[id(object)][1])
+
+    def add(self, object):
+        if id(object) in self.objects:
+            return
+        cells = self.getCells(object)
+        self.objects[id(object)] = (self.nextOrder, cells)
+        self.nextOrder += 1
+        for cell in cells:
+            if cell not in self.cells:
+                self.cells[cell] = {}
+            self.cells[cell][id(object)] = object
+        self.setCellsChanged(cells)
+
+    def remove(self, object):
+        if id(object) not in self.objects:
+            return
+        order, cells = self.objects.pop(id(object))
+        for cell in cells:
+            del self.cells[cell][id(object)]
+            if not self.cells[cell]:
+                del self.cells[cell]
+        self.setCellsChanged(cells)
+
+    def update(self, object):
+        # update the cells object is recorded in after object has moved. Does nothing if object is not in grid.
+        if id(object) not in self.objects:
+            return
+        order, oldCells = self.objects[id(object)]
+        cells = self.getCells(object)
+        # object may have moved within its cells so they have changed even if object is in the same cells.
+        self.setCellsChanged(oldCells)
+        if cells == oldCells:
+            return
+        for cell in oldCells:
+            del self.cells[cell][id(object)]
+            if not self.cells[cell]:
+                del self.cells[cell]
+        for cell in cells:
+            if cell not in self.cells:
+                self.cells[cell] = {}
+            self.cells[cell][id(object)] = object
+        self.objects[id(object)] = (order, cells)
+        self.setCellsChanged(cells)
+
+    def findObjects(self, x, y):
+        # return a list of all objects that contain x, y in the order they were added to the grid.
+        cell = (math.floor(x / self.cellSize), math.floor(y / self.cellSize))
+        if cell not in self.cells:
+            return []
+        found = [object for object in self.cells[cell].values() if geo.objectContains(object, x, y)]
+        if len(found) > 1:
+            found.sort(key=lambda object: self.objects[id(object)][0])
+        return found
+
+
+class AnchorGrid:
+    '''
+    The AnchorGrid class is responsible for quickly finding the objects (engine.sprite.Sprite) of one object list
+    whose anchor point is closest to a point.
+
+    The map area is divided into square cells of cellSize pixels and each object is recorded in the cell
+    that contains its anchor. findNear() searches rings of cells outwards from the point and stops as soon
+    as no object in a further ring could be closer than what has already been found.
+
+    The grid must be told when objects are added, removed, or moved. engine.map.Map does this
+    for the object lists it indexes (see Map.addAnchorGrid()).
+    '''
+
+    def __init__(self, cellSize, objectList=()):
+        self.cellSize = cellSize
+        self.cells = {}  # {(cellX, cellY): {id(object): object, ...}, ...}
+
+        # {id(object): (order, cell)} where order is used to break ties in distance by the order
+        # objects were added and cell is the cell the object is recorded in.
+        self.objects = {}
+        self.nextOrder = 0  # order of the next object added, if add() is not given an order.
+
+        for object in objectList:
+            self.add(object)
+
+    def __str__(self):
+        return engine.log.objectToStr(self)
+
+    def __len__(self):
+        return len(self.objects)
+
+    def getCell(self, object):
+        return (math.floor(object.anchorX / self.cellSize), math.floor(object.anchorY / self.cellSize))
+
+    def add(self, object, order=None):
+        # order breaks ties in distance (lower first). If None then object goes after all objects added so far.
+        if id(object) in self.objects:
+            return
+        if order is None:
+            order = self.nextOrder
+        self.nextOrder = max(self.nextOrder, order + 1)
+        cell = self.getCell(object)
+        self.objects[id(object)] = (order, cell)
+        if cell not in self.cells:
+            self.cells[cell] = {}
+        self.cells[cell][id(object)] = object
+
+    def getOrder(self, object):
+        return self.objects[id(object)][0]
+
+    def remove(self, object):
+        if id(object) not in self.objects:
+            return
+        order, cell = self.objects.pop(id(object))
+        del self.cells[cell][id(object)]
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def update(self, object):
+        # update the cell object is recorded in after object has moved. Does nothing if object is not in grid.
+        if id(object) not in self.objects:
+            return
+        order, oldCell = self.objects[id(object)]
+        cell = self.getCell(object)
+        if cell == oldCell:
+            return
+        del self.cells[oldCell][id(object)]
+        if not self.cells[oldCell]:
+            del self.cells[oldCell]
+        if cell not in self.cells:
+            self.cells[cell] = {}
+        self.cells[cell][id(object)] = object
+        self.objects[id(object)] = (order, cell)
+
+    def findNear(self, x, y, k=False, radius=False, exclude=False):
+        '''
+        return a list of (distance, order, object) for the objects with anchors closest to x, y, sorted by
+        distance (closest first) and then by order (see add()).
+            k: max number of objects to return (False == no limit)
+            radius: only return objects with anchors at most radius from x, y (False == no limit)
+            exclude: an object to leave out of the result.
+        '''
+        if k is not False and k <= 0:
+            return []
+        cellX = math.floor(x / self.cellSize)
+        cellY = math.floor(y / self.cellSize)
+        found = []
+        checked = 0
+        ring = 0
+        while checked < len(self.objects):
+            if ring > 1:
+                # all points in cells of this ring are at least minDistance from x, y
+                minDistance = (ring - 1) * self.cellSize
+                if radius is not False and minDistance > radius:
+                    break
+                if k is not False and len(found) >= k:
+                    found.sort(key=lambda f: (f[0], f[1]))
+                    del found[k:]
+                    if minDistance > found[-1][0]:
+                        break
+
+            for cell in self.getRing(cellX, cellY, ring):
+                if cell in self.cells:
+                    for object in self.cells[cell].values():
+                        checked += 1
+                        if object is exclude:
+                            continue
+                        distance = geo.distance(x, y, object.anchorX, object.anchorY)
+                        if radius is False or distance <= radius:
+                            found.append((distance, self.objects[id(object)][0], object))
+            ring += 1
+
+        found.sort(key=lambda f: (f[0], f[1]))
+        if k is not False:
+            del found[k:]
+        return found
+
+    def getRing(self, cellX, cellY, ring):
+        # return the cells that are exactly ring cells away (horizontally and/or vertically) from cellX, cellY.
+        if ring == 0:
+            return ((cellX, cellY),)
+        cells = []
+        for dx in range(-ring, ring + 1):
+            cells.append((cellX + dx, cellY - ring))
+            cells.append((cellX + dx, cellY + ring))
+        for dy in range(-ring + 1, ring):
+            cells.append((cellX - ring, cellY + dy))
+            cells.append((cellX + ring, cellY + dy))
+        return cells
@@ -0,0 +1,125 @@
+class Sprite:
+    '''
+    The Sprite class stores one object from a Tiled object layer (sprites, triggers, inBounds, ...).
+
+    The keys every object has (see engine.map.Map) and the tile keys are stored in __slots__ so they use less
+    memory than a dict and can be read directly as attributes (eg. sprite.anchorX) by engine code that is
+    run many times each step. All other keys, such as Tiled properties ("prop-*"), labelText, and keys added
+    by game mechanics, are stored in the props dict.
+
+    Sprite also supports the dict API (sprite["x"], "gid" in sprite, del sprite["gid"], get(), items(), ...)
+    for both kinds of keys, so code written for objects that are dicts keeps working.
+
+    Optional slot keys (spriteID, gid, tilesetName, tilesetTileNumber) are only present when in use, the same as
+    dict keys.
+    Two sprites are only equal if they are the same sprite.
+    '''
+
+    __slots__ = (
+        "name", "type", "x", "y", "width", "height", "anchorX", "anchorY", "mapName", "spriteID",
+        "gid", "tilesetName", "tilesetTileNumber", "props"
+        )
+
+    def __init__(self, object=()):
+        # object is a dict (or another Sprite) whose keys are copied into the new sprite.
+        self.props = {}
+        for key, value in dict(object).items():
+            self[key] = value
+
+    def __bool__(self):
+        # a sprite is always True, even though it is dict like, so "if sprite:" works like it does for a dict
+        # with keys. See engine.map.Map.findObject() which returns False if no object was found.
+        return True
+
+    def __repr__(self):
+        return repr(self.toDict())
+
+    def __getitem__(self, key):
+        if key in SLOTKEYS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return self.props[key]
+
+    def __setitem__(self, key, value):
+        if key in SLOTKEYS:
+            setattr(self, key, value)
+        else:
+            self.props[key] = value
+
+    def __delitem__(self, key):
+        if key in SLOTKEYS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        else:
+            del self.props[key]
+
+    def __contains__(self, key):
+        if key in SLOTKEYS:
+            return hasattr(self, key)
+        return key in self.props
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        return [key for key in SLOTKEYS_ORDERED if hasattr(self, key)] + list(self.props)
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, other=(), **kwargs):
+        for key, value in dict(other, **kwargs).items():
+            self[key] = value
+
+    def toDict(self, exclude=()):
+        '''
+        Return the sprite as a new dict, without the keys in exclude. Sprites in values (eg. sprite["holding"])
+        are also converted to dicts. Used to serialize the sprite.
+        '''
+        d = {}
+        for key in SLOTKEYS_ORDERED:
+            value = getattr(self, key, MISSING)
+            if value is not MISSING and key not in exclude:
+                d[key] = value
+        for key, value in self.props.items():
+            if key not in exclude:
+                if isinstance(value, Sprite):
+                    value = value.toDict()
+                d[key] = value
+        return d
+
+
+MISSING = object()  # default for getattr() of slots that are not set
+
+# keys stored in Sprite slots rather than Sprite.props
+SLOTKEYS_ORDERED = tuple(key for key in Sprite.__slots__ if key != "props")
+SLOTKEYS = frozenset(SLOTKEYS_ORDERED)
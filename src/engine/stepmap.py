@@ -1,8 +1,57 @@
 from engine.log import log
 import engine.map
+import engine.objectlist
 import engine.geometry as geo
 import engine.time as time
 import engine.server
+import functools
+import heapq
+
+
+def stepSpriteFilter(types=(), names=()):
+    '''
+    Decorator for stepSpriteStart*, stepMove*, and stepSpriteEnd* methods that declares which sprites the
+    method applies to. The method will only be called for sprites with a type in types or a name in names.
+
+    eg.
+        @engine.stepmap.stepSpriteFilter(types=("saw",))
+        def stepSpriteStartSaw(self, sprite):
+    '''
+    def decorator(method):
+        method.stepSpriteFilter = (tuple(types), tuple(names))
+        return method
+    return decorator
+
+
+def stepSpriteActive(activeName):
+    '''
+    Decorator for stepSpriteStart*, stepMove*, and stepSpriteEnd* methods that declares the method only
+    applies to sprites that are active for activeName (see StepMap.setSpriteActive()). This allows a method,
+    such as stepMove(), to skip sprites that have nothing to do, such as sprites that are not moving.
+
+    eg.
+        @engine.stepmap.stepSpriteActive("talk")
+        def stepSpriteStartTalk(self, sprite):
+    '''
+    def decorator(method):
+        method.stepSpriteActive = activeName
+        return method
+    return decorator
+
+
+def stepSpriteBatch(method):
+    '''
+    Decorator for stepSpriteStart*, stepMove*, and stepSpriteEnd* methods that should be called once per step
+    with a list of all the sprites the method applies to, rather than once for each sprite. This allows a
+    method to process many sprites together, such as stepMove() with engine.movecolumns.
+
+    eg.
+        @engine.stepmap.stepSpriteBatch
+        @engine.stepmap.stepSpriteActive("move")
+        def stepMove(self, sprites):
+    '''
+    method.stepSpriteBatch = True
+    return method
 
 
 class StepMap(engine.map.Map):
@@ -38,9 +87,28 @@ class StepMap(engine.map.Map):
         self.stepMethodPriority = {}
         for stepMethodType in self.stepMethodTypes:
             self.stepMethodPriority[stepMethodType] = {'default': 50}
+        self.stepMethodPriority["stepMapStart"]["stepMapStartTimers"] = 10
+
+        # timers set with setTimer()
+        self.timers = {}  # {key: timer} where timer is [deadline, order, key, callback, args, active]
+        self.timerHeap = []  # all timers, including inactive ones, as a heap ordered by deadline.
+        self.nextTimerOrder = 0
 
         self.stepMethods = {}
 
+        # {(types, names): ObjectList} the sprites that match each stepSpriteFilter in use, in the
+        # same order as self.sprites. Kept up to date by addObject(), removeObject(), and setObjectType().
+        self.stepSpriteLists = {}
+
+        # {id(sprite): (cacheKey, triggers)} the triggers each sprite was in the last time stepTriggers() was
+        # called for it. See getSpriteTriggers()
+        self.spriteTriggers = {}
+        self.triggerMethodNames = {}  # {trigger type: (enterMethodName, methodName, exitMethodName)}
+
+        # {activeName: {id(sprite): sprite}} the sprites that are active for each activeName. See setSpriteActive()
+        self.activeSprites = {}
+        self.spriteIDs = set(id(sprite) for sprite in self.sprites)  # id() of each sprite in self.sprites
+
         # Find init* methods in this instance (methods could be from this class or a subclass)
         # Note, one important job of init methods is to add to
         # self.stepMethodPriority before the step methods are found and sorted
@@ -83,6 +151,73 @@ class StepMap(engine.map.Map):
         log(f"Map {self.name}: Found trigger methods (in order): {triggerMethods}")
         '''
 
+        self.compileStepMethods()
+
+        # step method profiling is off by default. See setStepMethodProfiling()
+        self.stepMethodProfiling = False
+        self.stepMethodStats = {}
+        # upper bound (secs) of each step method duration histogram bucket. The last bucket has no upper bound.
+        self.STEP_METHOD_HISTOGRAM = (0.00001, 0.0001, 0.001, 0.01, float("inf"))
+
+    def __getstate__(self):
+        '''
+        Return the state of this map for pickle (see engine.map.Map.__getstate__()). Timers are saved with
+        the map. Any int in a timer key (a tuple) that is id() of one of the timer's args is saved as the position
+        of that arg so the key can use the new id() once unpickled, eg. ("speechText", id(sprite)).
+        '''
+        state = super().__getstate__()
+        sprites = {id(sprite): sprite for sprite in self.sprites}
+        # keep the triggers each sprite was in but not the cache keys since trigger grid cell versions will change.
+        state["spriteTriggers"] = [
+            (sprites[spriteID], (None, triggers))
+            for spriteID, (cacheKey, triggers) in self.spriteTriggers.items() if spriteID in sprites]
+        state["activeSprites"] = {
+            activeName: list(activeSprites.values()) for activeName, activeSprites in self.activeSprites.items()}
+        # timers are rebuilt by __setstate__() which also forgets cancelled timers.
+        state["timers"] = []
+        for deadline, order, key, callback, args, active in sorted(self.timers.values()):
+            argIDs = {id(arg): i for i, arg in enumerate(args)}
+            keyArgs = {}  # {position in key: position in args}
+            if isinstance(key, tuple):
+                keyArgs = {i: argIDs[k] for i, k in enumerate(key) if type(k) is int and k in argIDs}
+            if getattr(callback, "__self__", None) is self:
+                callback = callback.__name__  # methods of this map are found again by name.
+            state["timers"].append((deadline, key, keyArgs, callback, args))
+        del state["timerHeap"]
+
+        # the step pipeline and profiling wrappers are rebuilt by __setstate__()
+        for key in ("spriteIDs", "stepPipeline", "triggerMethods"):
+            del state[key]
+        if self.stepMethodProfiling:
+            for key in list(state):
+                if callable(state[key]) and hasattr(type(self), key):
+                    del state[key]
+            state["stepMethodProfiling"] = False
+        state["restoreStepMethodProfiling"] = self.stepMethodProfiling
+        return state
+
+    def __setstate__(self, state):
+        restoreStepMethodProfiling = state.pop("restoreStepMethodProfiling")
+        super().__setstate__(state)
+        self.spriteTriggers = {id(sprite): cached for sprite, cached in state["spriteTriggers"]}
+        self.activeSprites = {
+            activeName: {id(sprite): sprite for sprite in activeSprites}
+            for activeName, activeSprites in state["activeSprites"].items()}
+        self.spriteIDs = set(id(sprite) for sprite in self.sprites)
+        self.timers = {}
+        self.timerHeap = []
+        for deadline, key, keyArgs, callback, args in state["timers"]:
+            if keyArgs:
+                key = list(key)
+                for keyPosition, argPosition in keyArgs.items():
+                    key[keyPosition] = id(args[argPosition])
+                key = tuple(key)
+            if isinstance(callback, str):
+                callback = getattr(self, callback)
+            self.setTimer(key, deadline, callback, *args)
+        self.compileStepMethods()
+        self.setStepMethodProfiling(restoreStepMethodProfiling)
+
     def addStepMethodPriority(self, stepMethodType, stepMethodName, priority):
         # used by subclass init* methods to prioritize step methods before finding and sorting them.
         if stepMethodType not in self.stepMethodPriority:
@@ -90,6 +225,127 @@ class StepMap(engine.map.Map):
             return
         self.stepMethodPriority[stepMethodType][stepMethodName] = priority
 
+    def compileStepMethods(self):
+        '''
+        Build self.stepPipeline so stepMap() does not need to look up step methods by name or call them
+        for sprites they do not apply to.
+
+        self.stepPipeline = {stepMethodType: [(bound step method, list of sprites to call it for, batch), ...], ...}
+        where the list of sprites is self.sprites, or if the method has a stepSpriteFilter, the list
+        from self.stepSpriteLists of only the sprites that match the filter, or if the method has a
+        stepSpriteActive, the dict from self.activeSprites of only the sprites that are active. batch is
+        True if the method has stepSpriteBatch and should be called once with all the sprites.
+        '''
+        self.stepPipeline = {}
+        for stepMethodType in self.stepMethodTypes:
+            if stepMethodType == "trigger":
+                # trigger methods are called by stepTriggers() by name (see getSpriteTriggers()).
+                self.triggerMethods = {}
+                for methodName in self.stepMethods["trigger"]:
+                    self.triggerMethods[methodName] = getattr(self, methodName, None)
+                continue
+            self.stepPipeline[stepMethodType] = []
+            for methodName in self.stepMethods[stepMethodType]:
+                method = getattr(self, methodName, None)
+                spriteFilter = getattr(method, "stepSpriteFilter", None)
+                activeName = getattr(method, "stepSpriteActive", None)
+                if activeName is not None:
+                    sprites = self.activeSprites.setdefault(activeName, {})
+                elif spriteFilter is None:
+                    sprites = self.sprites
+                else:
+                    if spriteFilter not in self.stepSpriteLists:
+                        self.stepSpriteLists[spriteFilter] = engine.objectlist.ObjectList(
+                            sprite for sprite in self.sprites if self.checkStepSpriteFilter(spriteFilter, sprite))
+                    sprites = self.stepSpriteLists[spriteFilter]
+                batch = getattr(method, "stepSpriteBatch", False)
+                self.stepPipeline[stepMethodType].append((method, sprites, batch))
+
+    def checkStepSpriteFilter(self, spriteFilter, sprite):
+        # return True if sprite matches spriteFilter (see stepSpriteFilter())
+        types, names = spriteFilter
+        return sprite["type"] in types or sprite["name"] in names
+
+    ########################################################
+    # STEP SPRITE LISTS
+    ########################################################
+
+    def addObject(self, object, objectList=False):
+        super().addObject(object, objectList)
+        if not self.isObjectList(objectList) or objectList is self.sprites:
+            self.spriteIDs.add(id(object))
+            for spriteFilter, sprites in self.stepSpriteLists.items():
+                if self.checkStepSpriteFilter(spriteFilter, object):
+                    sprites.append(object)
+
+    def removeObject(self, object, objectList=False):
+        super().removeObject(object, objectList)
+        if not self.isObjectList(objectList) or objectList is self.sprites:
+            self.spriteIDs.discard(id(object))
+            for sprites in self.stepSpriteLists.values():
+                if object in sprites:
+                    sprites.remove(object)
+            for sprites in self.activeSprites.values():
+                sprites.pop(id(object), None)
+            # Note, triggerExit* methods are not called for a sprite that is removed from the map.
+            self.spriteTriggers.pop(id(object), None)
+
+    def setObjectType(self, object, type):
+        super().setObjectType(object, type)
+        if object in self.sprites:
+            for spriteFilter, sprites in self.stepSpriteLists.items():
+                if self.checkStepSpriteFilter(spriteFilter, object) != (object in sprites):
+                    # rebuild list in place so it stays in the same order as self.sprites.
+                    sprites[:] = [sprite for sprite in self.sprites if self.checkStepSpriteFilter(spriteFilter, sprite)]
+
+    def setSpriteActive(self, sprite, activeName):
+        '''
+        Mark sprite as active for activeName so step methods decorated with stepSpriteActive(activeName)
+        will be called for it. Sprites that are not on this map's sprite layer are ignored. A sprite
+        stops being active when it is removed from the sprite layer or delSpriteActive() is called.
+        '''
+        if id(sprite) in self.spriteIDs:
+            if activeName not in self.activeSprites:
+                self.activeSprites[activeName] = {}
+            self.activeSprites[activeName][id(sprite)] = sprite
+
+    def delSpriteActive(self, sprite, activeName):
+        if activeName in self.activeSprites:
+            self.activeSprites[activeName].pop(id(sprite), None)
+
+    ########################################################
+    # TIMERS
+    ########################################################
+
+    def setTimer(self, key, deadline, callback, *args):
+        '''
+        Call callback(*args) at the start of the first step after time.perf_counter() passes deadline. A
+        deadline of 0 will call callback at the start of the next step.
+
+        key is any hashable value that identifies the timer. If a timer with key is already set then it
+        is replaced. Timers are only processed while this map is being stepped.
+        '''
+        self.delTimer(key)
+        timer = [deadline, self.nextTimerOrder, key, callback, args, True]
+        self.nextTimerOrder += 1
+        self.timers[key] = timer
+        heapq.heappush(self.timerHeap, timer)
+
+    def delTimer(self, key):
+        # cancel timer with key if it has not been called yet.
+        if key in self.timers:
+            # leave the timer in timerHeap since removing it would be O(n). It will be skipped when it expires.
+            self.timers.pop(key)[5] = False
+
+    def stepMapStartTimers(self):
+        # call each timer that has expired, in order of deadline.
+        currentTime = time.perf_counter()
+        while self.timerHeap and self.timerHeap[0][0] < currentTime:
+            deadline, order, key, callback, args, active = heapq.heappop(self.timerHeap)
+            if active:
+                del self.timers[key]
+                callback(*args)
+
     ########################################################
     # STEP DISPATCHER (Order of steps matters!)
     ########################################################
@@ -98,15 +354,11 @@ class StepMap(engine.map.Map):
         # move the map forward one step in time by calling all step methods
 
         # call all self.stepMapStart*() methods
-        for methodName in self.stepMethods["stepMapStart"]:
-            method = getattr(self, methodName, None)
+        for method, sprites, batch in self.stepPipeline["stepMapStart"]:
             method()
 
         # call all self.stepSpriteStart*(sprite) methods for each sprite
-        for methodName in self.stepMethods["stepSpriteStart"]:
-            method = getattr(self, methodName, None)
-            for sprite in self.sprites:
-                method(sprite)
+        self.stepSpriteMethods("stepSpriteStart")
 
         # call each trigger once for each sprite with an anchor point inside the trigger.
         # call will look like self.trigger*(trigger, sprite)
@@ -114,51 +366,221 @@ class StepMap(engine.map.Map):
             self.stepTriggers(sprite)
 
         # call all self.stepMove*(sprite) methods for each sprite
-        for methodName in self.stepMethods["stepMove"]:
-            method = getattr(self, methodName, None)
-            for sprite in self.sprites:
-                method(sprite)
+        self.stepSpriteMethods("stepMove")
 
         # call all self.stepSpriteEnd*(sprite) methods  for each sprite
-        for methodName in self.stepMethods["stepSpriteEnd"]:
-            method = getattr(self, methodName, None)
-            for sprite in self.sprites:
-                method(sprite)
+        self.stepSpriteMethods("stepSpriteEnd")
 
         # call all self.stepMapEnd*() methods
-        for methodName in self.stepMethods["stepMapEnd"]:
-            method = getattr(self, methodName, None)
+        for method, sprites, batch in self.stepPipeline["stepMapEnd"]:
             method()
 
+    def stepSpriteMethods(self, stepMethodType):
+        # call each stepMethodType method in self.stepPipeline for the sprites it applies to.
+        for method, sprites, batch in self.stepPipeline[stepMethodType]:
+            if isinstance(sprites, dict):
+                # active sprites may become inactive during the loop so loop over a copy.
+                sprites = tuple(sprites.values())
+            if batch:
+                method(sprites)
+                continue
+            for sprite in sprites:
+                method(sprite)
+
     def stepTriggers(self, sprite):
-        # find all triggers that contain this sprite's anchor and process each one.
+        '''
+        Process the triggers that contain this sprite's anchor. For a trigger with trigger["type"] == "mapDoor":
+            triggerEnterMapDoor(trigger, sprite) is called on the first step sprite is inside the trigger.
+            triggerMapDoor(trigger, sprite) is called on every step sprite is inside the trigger.
+            triggerExitMapDoor(trigger, sprite) is called on the first step sprite is no longer inside the trigger.
+        Each method is optional but a trigger type must have at least one of them.
+
+        Exit methods are called first and then the enter and every step methods of each trigger, in priority order.
+        If an enter or every step method returns True then no more triggers are processed for this sprite this step.
+        '''
+        triggers, entered, exited = self.getSpriteTriggers(sprite)
+
+        for trigger, exitMethodName in exited:
+            self.triggerMethods[exitMethodName](trigger, sprite)
+
+        # call each triggers methods. e.g. trigger['type'] == 'mapDoor' will call triggerMapDoor(trigger, sprite)
+        for i, (trigger, enterMethodName, methodName) in enumerate(triggers):
+            stop = False
+            if enterMethodName and id(trigger) in entered:
+                stop = self.triggerMethods[enterMethodName](trigger, sprite)
+            if methodName and not stop:
+                stop = self.triggerMethods[methodName](trigger, sprite)
+            if stop:
+                # do not process any more triggers for this sprite on this step.
+                self.forgetSkippedTriggers(sprite, triggers, entered, i + 1)
+                break
+
+    def forgetSkippedTriggers(self, sprite, triggers, entered, start):
+        '''
+        triggers[start:] were not processed because an earlier trigger stopped processing. Remove the ones sprite
+        has just entered from sprite's cached triggers so they are treated as entered on the next step rather than
+        never having their enter method called (and possibly having their exit method called).
+        '''
+        skipped = set(id(t[0]) for t in triggers[start:] if id(t[0]) in entered)
+        if not skipped:
+            return
+        cached = self.spriteTriggers.get(id(sprite))
+        if cached is None or cached[1] is not triggers:
+            return  # sprite was removed from this map by a trigger.
+        # no cacheKey so the triggers are found again on the next step.
+        self.spriteTriggers[id(sprite)] = (None, [t for t in triggers if id(t[0]) not in skipped])
+
+    def getSpriteTriggers(self, sprite):
+        '''
+        return (triggers, entered, exited) where:
+            triggers is a list of (trigger, enterMethodName, methodName) for each trigger that contains sprite's
+                anchor, sorted by priority (lower first). Method names are None if the method does not exist.
+            entered is a set of id(trigger) for triggers that were not in triggers the last time this was called.
+            exited is a list of (trigger, exitMethodName) for triggers that have an exit method and were in
+                triggers the last time this was called but are not now.
+
+        The result is cached and only found again if the sprite has moved or the trigger grid cell the
+        sprite's anchor is in has changed.
+        '''
+        x = sprite.anchorX
+        y = sprite.anchorY
+        cacheKey = None
+        if not (x == False or y == False):  # findObject() does not use x, y if either is 0 so do not cache.
+            cacheKey = (x, y, self.objectGrids[id(self.triggers)].getCellVersion(x, y))
+
+        old = self.spriteTriggers.get(id(sprite))
+        if old and cacheKey is not None and old[0] == cacheKey:
+            return old[1], (), ()
+
+        # find all triggers that contain this sprite's anchor.
         # make sure to exclude sprite since objects may be on the sprite and trigger layer at the same time.
-        triggers = self.findObject(
-            x=sprite["anchorX"],
-            y=sprite["anchorY"],
-            objectList=self.triggers,
-            returnAll=True,
-            exclude=sprite)
-
-        for trigger in triggers:
-            triggerMehodName = self.getTriggerMethodName(trigger)
-            # if trigger is not in priority list then log error and remove it
-            if triggerMehodName not in self.stepMethodPriority['trigger']:
+        found = self.findObject(x=x, y=y, objectList=self.triggers, returnAll=True, exclude=sprite)
+
+        triggers = []
+        priorities = {}
+        for trigger in found:
+            enterMethodName, methodName, exitMethodName = self.getTriggerMethodNames(trigger)
+            # if trigger does not have any methods then log error and skip it
+            if not (enterMethodName or methodName or exitMethodName):
                 log(
-                    f"ServerMap does not have method named {triggerMehodName} for trigger type {trigger['type']}.",
+                    f"ServerMap does not have method named {self.getTriggerMethodName(trigger)} "
+                    f"for trigger type {trigger['type']}.",
                     "ERROR")
-                triggers.remove(trigger)
+                continue
+            triggers.append((trigger, enterMethodName, methodName))
+            priorities[id(trigger)] = self.stepMethodPriority['trigger'][
+                methodName or enterMethodName or exitMethodName]
 
         # sort triggers by priority (lower first)
-        triggers.sort(key=lambda trigger: self.stepMethodPriority['trigger'][self.getTriggerMethodName(trigger)])
+        triggers.sort(key=lambda t: priorities[id(t[0])])
+        self.spriteTriggers[id(sprite)] = (cacheKey, triggers)
 
-        # call each triggers method. e.g. trigger['type'] == 'mapDoor' will call triggerMapDoor(trigger, sprite)
-        for trigger in triggers:
-            triggerMethod = getattr(self, self.getTriggerMethodName(trigger), None)
-            stopOtherTriggers = triggerMethod(trigger, sprite)
-            if stopOtherTriggers:
-                break  # do not process any more triggers for this sprite on this step.
+        oldTriggers = old[1] if old else []
+        oldIDs = set(id(t[0]) for t in oldTriggers)
+        newIDs = set(id(t[0]) for t in triggers)
+        entered = newIDs - oldIDs
+        exited = []
+        for trigger, enterMethodName, methodName in oldTriggers:
+            if id(trigger) not in newIDs:
+                exitMethodName = self.getTriggerMethodNames(trigger)[2]
+                if exitMethodName:
+                    exited.append((trigger, exitMethodName))
+        return triggers, entered, exited
+
+    def getTriggerMethodNames(self, trigger):
+        '''
+        return (enterMethodName, methodName, exitMethodName) for trigger's type. eg. trigger["type"] == "mapDoor"
+        returns ("triggerEnterMapDoor", "triggerMapDoor", "triggerExitMapDoor"). Names of methods that do not exist
+        are None.
+        '''
+        if trigger.type not in self.triggerMethodNames:
+            methodName = self.getTriggerMethodName(trigger)
+            names = []
+            for name in (
+                    "triggerEnter" + methodName[len("trigger"):],
+                    methodName,
+                    "triggerExit" + methodName[len("trigger"):]):
+                names.append(name if name in self.stepMethodPriority['trigger'] else None)
+            self.triggerMethodNames[trigger.type] = tuple(names)
+        return self.triggerMethodNames[trigger.type]
 
     def getTriggerMethodName(self, trigger):
         # Convert a trigger type (eg. trigger["type"] == "mapDoor") to method name (eg. "triggerMapDoor")
         return "trigger" + trigger['type'][:1].capitalize() + trigger['type'][1:]
+
+    ########################################################
+    # STEP METHOD PROFILING
+    ########################################################
+
+    def setStepMethodProfiling(self, on=True):
+        '''
+        Turn on or off recording of call counts and durations for all step methods and trigger methods
+        of this map. Profiling is off by default since it adds overhead to every step method call.
+
+        When on, each step/trigger method is shadowed by an instance attribute of the same name which
+        times the call to the real method. stepTriggers() looks up methods by name and stepMap() uses
+        self.stepPipeline (rebuilt below) so both call the timing wrappers without needing to know
+        profiling is on.
+        '''
+        if on == self.stepMethodProfiling:
+            return
+        self.stepMethodProfiling = on
+
+        methodNames = []
+        for stepMethodType in self.stepMethodTypes:
+            if stepMethodType == "trigger":
+                methodNames += [name for name in self.stepMethodPriority["trigger"] if name != "default"]
+            else:
+                methodNames += self.stepMethods[stepMethodType]
+
+        for methodName in methodNames:
+            if on:
+                method = getattr(self, methodName, None)
+                if callable(method):
+                    setattr(self, methodName, self.getProfiledStepMethod(methodName, method))
+            elif methodName in self.__dict__:
+                delattr(self, methodName)  # remove the wrapper so the class method is found again.
+
+        self.compileStepMethods()
+
+    def getProfiledStepMethod(self, methodName, method):
+        # return a function that calls method and records how long it took in self.stepMethodStats[methodName]
+        stats = self.stepMethodStats.setdefault(methodName, {
+            "calls": 0,
+            "totalTime": 0,
+            "maxTime": 0,
+            "histogram": [0] * len(self.STEP_METHOD_HISTOGRAM)
+            })
+        histogram = stats["histogram"]
+        bounds = self.STEP_METHOD_HISTOGRAM
+
+        def profiledStepMethod(*args):
+            startAt = time.perf_counter()
+            result = method(*args)
+            duration = time.perf_counter() - startAt
+            stats["calls"] += 1
+            stats["totalTime"] += duration
+            if duration > stats["maxTime"]:
+                stats["maxTime"] = duration
+            for i in range(len(bounds)):
+                if duration < bounds[i]:
+                    histogram[i] += 1
+                    break
+            return result
+
+        # copy attributes, such as stepSpriteFilter, from method to the wrapper.
+        return functools.update_wrapper(profiledStepMethod, method)
+
+    def getStepMethodStats(self):
+        # return step method stats (since profiling started) as a str with most total time first.
+        stats = [(methodName, s) for methodName, s in self.stepMethodStats.items() if s["calls"]]
+        if not stats:
+            return f"Map {self.name}: no step methods called."
+        stats.sort(key=lambda item: item[1]["totalTime"], reverse=True)
+
+        text = f"Map {self.name} step methods (calls, total/avg/max ms, calls <10us/<100us/<1ms/<10ms/>=10ms):"
+        for methodName, s in stats:
+            text += f"\n    {methodName}: {s['calls']}, " + \
+                f"{s['totalTime'] * 1000:.2f}/{s['totalTime'] / s['calls'] * 1000:.3f}/{s['maxTime'] * 1000:.3f}, " + \
+                "/".join(str(n) for n in s["histogram"])
+        return text
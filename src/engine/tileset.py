@@ -2,6 +2,7 @@ import json
 
 import engine.log
 from engine.log import log
+import engine.mapcache
 
 
 class Tileset:
@@ -19,8 +20,15 @@ class Tileset:
         # Tileset name is based on tilesetFile with .json removed
         self.name = tilesetFile.split("/")[-1].split(".")[0]
 
-        with open(self.tilesetFile) as f:
-            ts = json.load(f)
+        # read tiled tileset file, or if the tileset has been loaded before then the already cleaned data from
+        # the cache.
+        cacheName = f"{self.tilesetFile.split('/')[-3]}-{self.name}-{type(self).__name__}"
+        cacheKey = engine.mapcache.getCacheKey(self, [self.tilesetFile])
+        ts = engine.mapcache.loadCache(cacheName, cacheKey)
+        cached = ts is not None
+        if not cached:
+            with open(self.tilesetFile) as f:
+                ts = json.load(f)
 
         if ts["type"] != "tileset":
             log(f"{failename} does not appear to be a tileset!", "FAILURE")
@@ -49,27 +57,34 @@ class Tileset:
         self.tiles = {}
         if "tiles" in ts:
             for tile in ts["tiles"]:
-                '''
-                convert tiled object properties into an easier to access form.
-                from: {object["properties"][{name: name1, value: value1}],[...]}
-                to: {object["prop-name1"]=value1,...}
-
-                Note, duplicate property names is not supported!
-                '''
-                if "properties" in tile:
-                    for prop in tile["properties"]:
-                        tile["prop-" + prop["name"]] = prop["value"]
-                    del tile["properties"]
-
-                # compute total length of animation
-                if "animation" in tile:
-                    tile["animationDuration"] = 0
-                    for t in tile["animation"]:
-                        tile["animationDuration"] += t["duration"]
-                    # convert to seconds
-                    tile["animationDuration"] /= 1000
-
+                if not cached:
+                    self.cleanTile(tile)
                 self.tiles[tile['id']] = tile
 
+        if not cached:
+            # save the cleaned tileset data so the next start can skip reading the tiled file and cleaning the tiles.
+            engine.mapcache.saveCache(cacheName, cacheKey, ts)
+
+    def cleanTile(self, tile):
+        '''
+        convert tiled object properties into an easier to access form.
+        from: {object["properties"][{name: name1, value: value1}],[...]}
+        to: {object["prop-name1"]=value1,...}
+
+        Note, duplicate property names is not supported!
+        '''
+        if "properties" in tile:
+            for prop in tile["properties"]:
+                tile["prop-" + prop["name"]] = prop["value"]
+            del tile["properties"]
+
+        # compute total length of animation
+        if "animation" in tile:
+            tile["animationDuration"] = 0
+            for t in tile["animation"]:
+                tile["animationDuration"] += t["duration"]
+            # convert to seconds
+            tile["animationDuration"] /= 1000
+
     def __str__(self):
         return engine.log.objectToStr(self)
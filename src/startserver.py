@@ -39,6 +39,12 @@ def startServer():
                         default=0, help='Duration to pause in seconds before starting server (for testing)')
     parser.add_argument('-test', dest='testMode', action='store_true',
                         default=False, help='Start server in test mode')
+    parser.add_argument('-nocheck', dest='checkSendMsgs', action='store_false',
+                        default=True, help='Do not validate msgs built by the server before sending them (faster)')
+    parser.add_argument('-profile', dest='profileStepMethods', action='store_true',
+                        default=False, help='Record and log the time taken by each map step method (slower)')
+    parser.add_argument('-unload', metavar='secs', dest='unloadMapsAfter', type=int,
+                        default=300, help='Unload maps with no players or timers after secs (0 == never unload maps)')
 
     parser.add_argument('-verbose', dest='verbose', action='store_true',
                         default=False, help='Print VERBOSE level log messages')
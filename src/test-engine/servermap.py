@@ -1,13 +1,25 @@
-  ########################################################
-  # Portkey (uses action, and mapdoor)
-  ########################################################
+from engine.log import log
+import engine.servermap
 
-  '''
+
+class ServerMap(engine.servermap.ServerMap):
+    '''
+    This class implements the Portkey mechanic and layer and object timers.
+
+    The layers and objects in object layers have the following keys added for this subclass:
+    dynamic keys (only in layer/object while in use): showAfter, hideAfter, delAfter
+    '''
+
+    ########################################################
+    # Portkey (uses action, and mapdoor)
+    ########################################################
+
+    '''
     A portkey is a map door that is a visable sprite and requires the player to request an action before
     they will go through the mapDoor.
     '''
 
-   def initPortkey(self):
+    def initPortkey(self):
         # portkey sprites need to be triggers so things can
         # be done when another sprite interacts with them.
         # copy (by refernece) sprites to triggers
@@ -30,56 +42,70 @@
     ########################################################
 
     def setLayerShowAfter(self, layer, showAfter=0):
+        # show layer after time.perf_counter() passes showAfter.
         layer["showAfter"] = showAfter
+        self.setTimer(("showAfter", layer["name"]), showAfter, self.showLayerAfter, layer)
 
     def delLayerShowAfter(self, layer):
-        del layer["showAfter"]
+        if "showAfter" in layer:
+            del layer["showAfter"]
+        self.delTimer(("showAfter", layer["name"]))
+
+    def showLayerAfter(self, layer):
+        # called by showAfter timer.
+        self.setLayerVisablitybyName(layer["name"], True)
+        self.delLayerShowAfter(layer)
 
     def setLayerHideAfter(self, layer, hideAfter=0):
+        # hide layer after time.perf_counter() passes hideAfter.
         layer["hideAfter"] = hideAfter
+        self.setTimer(("hideAfter", layer["name"]), hideAfter, self.hideLayerAfter, layer)
 
     def delLayerHideAfter(self, layer):
-        del layer["hideAfter"]
-
-    def initLayerTimers(self):
-        self.addStepMethodPriority("stepMapStart", "stepMapStartLayerTimers", 10)
+        if "hideAfter" in layer:
+            del layer["hideAfter"]
+        self.delTimer(("hideAfter", layer["name"]))
 
-    def stepMapStartLayerTimers(self):
-        # Set visibility to true/false for any layers with expired "hideAfter"/"showAfter".
-        currentTime = time.perf_counter()
-        for layer in self.layers:
-            if "hideAfter" in layer and layer["hideAfter"] < currentTime:
-                # hide the layer
-                self.setLayerVisablitybyName(layer["name"], False)
-                self.delLayerHideAfter(layer)
-            if "showAfter" in layer and layer["showAfter"] < currentTime:
-                # show the layer
-                self.setLayerVisablitybyName(layer["name"], True)
-                self.delLayerShowAfter(layer)
+    def hideLayerAfter(self, layer):
+        # called by hideAfter timer.
+        self.setLayerVisablitybyName(layer["name"], False)
+        self.delLayerHideAfter(layer)
 
     ########################################################
     # OBJECT (delAfter) TIMERS
     ########################################################
 
+    def initObjectTimers(self):
+        self.addServerOnlySpriteKeys("delAfter")
+
     def setObjectDelAfter(self, object, delAfter=0):
+        # del object from all object layers it is on after time.perf_counter() passes delAfter.
         if delAfter > 0:
             object["delAfter"] = delAfter
+            self.setTimer(("delAfter", id(object)), delAfter, self.delObjectAfter, object)
         else:
             self.delObjectDelAfter(object)
 
     def delObjectDelAfter(self, object):
-        del object["delAfter"]
+        if "delAfter" in object:
+            del object["delAfter"]
+        self.delTimer(("delAfter", id(object)))
 
-    def initObjectTimers(self):
-        self.addStepMethodPriority("stepMapStart", "stepMapStartObjectTimers", 10)
-
-    def stepMapStartObjectTimers(self):
-        # del object from any object layers it is on if it's delAfter as expired.
-        currentTime = time.perf_counter()
+    def delObjectAfter(self, object):
+        # called by delAfter timer.
+        self.delObjectDelAfter(object)
         for layer in self.layers:
-            if layer["type"] == "objectgroup":
-                for object in layer['objects']:
-                    # del any objects on object layers that have expired "delAfter".
-                    if "delAfter" in object and object["delAfter"] > currentTime:
-                        # remove expired object
-                        self.removeObject(object, objectList=layer["objects"])
+            if layer["type"] == "objectgroup" and object in layer["objects"]:
+                self.removeObject(object, objectList=layer["objects"])
+
+    def addObject(self, object, objectList=False):
+        super().addObject(object, objectList)
+        # object may have had a delAfter set on another map.
+        if "delAfter" in object:
+            self.setTimer(("delAfter", id(object)), object["delAfter"], self.delObjectAfter, object)
+
+    def removeObject(self, object, objectList=False):
+        super().removeObject(object, objectList)
+        # delAfter timer will be set again if object is added to a map.
+        if not any(layer["type"] == "objectgroup" and object in layer["objects"] for layer in self.layers):
+            self.delTimer(("delAfter", id(object)))